@@ -0,0 +1,398 @@
+import asyncio
+import json
+import time
+from bisect import bisect_right
+from logging import getLogger
+from typing import Iterable, Optional
+
+import aiohttp
+
+from API.live_status import StatusSnapshot, live_status
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+BASE_URL = "https://www.train-guide.westjr.co.jp"
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=5)
+
+# 駅一覧（_st.json）はほとんど変わらないため長めに保持する
+STATION_MASTER_TTL = 24 * 60 * 60
+
+# 路線一覧（area_*_master.json）の有効期間
+AREA_MASTER_TTL = 6 * 60 * 60
+
+# 列車走行位置のエリア（エリアID -> 表示名）
+AREAS = {
+    "kinki": "近畿エリア",
+    "okayama": "岡山・福山エリア",
+    "hiroshima": "広島・山口エリア",
+    "sanin": "山陰エリア",
+    "hokuriku": "北陸エリア",
+}
+
+# 通知する遅延の段階（分）。この値をまたいだときに通知する
+DELAY_THRESHOLDS = (5, 10, 15, 30, 60)
+
+# 遅延状態の変化の種類
+DELAYED = "delayed"
+WORSENED = "worsened"
+RECOVERED = "recovered"
+GONE = "gone"  # 遅延中の列車が走行位置から消えた（終着など。通知はせず履歴だけに残す）
+
+# 列車位置をコマンドから読むときに許容する古さ（秒）
+TRAINS_MAX_AGE = 60
+
+# Discord の選択肢の上限に合わせて路線グループを分割する
+GROUP_SIZE = 25
+
+
+async def fetch_json(session: aiohttp.ClientSession, url: str):
+    """共有セッションでJSONを取得する"""
+    async with session.get(url, timeout=REQUEST_TIMEOUT) as res:
+        res.raise_for_status()
+        return await res.json(content_type=None)
+
+
+async def fetch_bytes(session: aiohttp.ClientSession, url: str) -> bytes:
+    """共有セッションでレスポンス本文を取得する（解析は呼び出し側で行う）"""
+    async with session.get(url, timeout=REQUEST_TIMEOUT) as res:
+        res.raise_for_status()
+        return await res.read()
+
+
+def line_url(line_pos: str) -> str:
+    """路線の列車位置JSONのURL"""
+    return f"{BASE_URL}{line_pos}"
+
+
+def area_master_url(area: str) -> str:
+    """エリアの路線一覧JSONのURL"""
+    return f"{BASE_URL}/api/v3/area_{area}_master.json"
+
+
+def station_master_url(line_pos: str) -> str:
+    """路線の駅一覧JSONのURL"""
+    return line_url(line_pos).replace(".json", "_st.json")
+
+
+def parse_station_master(body: bytes) -> dict[str, str]:
+    """駅一覧JSONを 駅コード -> 駅名 の辞書に変換"""
+    data_st = json.loads(body)
+    return {
+        station["info"]["code"]: station["info"]["name"]
+        for station in data_st["stations"]
+    }
+
+
+def parse_trains(body: bytes, dictst: dict[str, str]) -> list[dict]:
+    """列車位置JSONを列車ごとの辞書に変換"""
+    data = json.loads(body)
+    trains = []
+    for item in data["trains"]:
+        stn = item["pos"].split("_")
+        try:
+            position = dictst[stn[0]] + "辺り"
+        except KeyError:
+            position = "どこかよくわかんない"
+
+        tc = item.get("typeChange", "")
+        if tc == " ":
+            tc = ""
+
+        display_type = item["displayType"]
+        if display_type.endswith("○"):
+            display_type = display_type[:-1] + "速"
+
+        dest_text = (
+            item["dest"]["text"]
+            if isinstance(item["dest"], dict)
+            else item["dest"]
+        )
+        trains.append({
+            "no": item["no"],
+            "display_type": display_type,
+            "dest": dest_text,
+            "type_change": tc,
+            "delay_minutes": item["delayMinutes"],
+            "position": position,
+        })
+    return trains
+
+
+def parse_delayed_trains(body: bytes, dictst: dict[str, str]) -> list[dict]:
+    """列車位置JSONから遅れている列車を取り出す"""
+    return [train for train in parse_trains(body, dictst) if train["delay_minutes"] > 0]
+
+
+def format_delayed_train(train: dict) -> str:
+    """遅れている列車1本分の表示用文字列"""
+    return (
+        f"{train['display_type']} {train['dest']}行き {train['type_change']} "
+        f"{train['no']} {train['delay_minutes']}分遅れ {train['position']}"
+    )
+
+
+async def fetch_trains(session: aiohttp.ClientSession, line_pos: str) -> list[dict]:
+    """路線を走行中の全列車を取得（駅一覧はキャッシュを使用）"""
+    body, dictst = await asyncio.gather(
+        fetch_bytes(session, line_url(line_pos)),
+        station_masters.get(session, line_pos),
+    )
+    # JSONの解析はイベントループの外で行う
+    return await asyncio.to_thread(parse_trains, body, dictst)
+
+
+async def get_live_trains(
+    session: aiohttp.ClientSession,
+    line_pos: str,
+    max_age: float = TRAINS_MAX_AGE,
+    force_refresh: bool = False,
+) -> StatusSnapshot:
+    """運行状況ストア経由で路線の全列車を取得（監視タスクの取得結果を共有する）"""
+    return await live_status.get(
+        f"jr_west:{line_pos}",
+        lambda: fetch_trains(session, line_pos),
+        max_age,
+        force_refresh,
+    )
+
+
+async def fetch_delayed_trains(
+    session: aiohttp.ClientSession, line_pos: str, max_age: float = TRAINS_MAX_AGE
+) -> list[dict]:
+    """路線の遅れている列車を取得（max_age 秒以内に取得済みならそれを使う）"""
+    snapshot = await get_live_trains(session, line_pos, max_age)
+    return [train for train in snapshot.data if train["delay_minutes"] > 0]
+
+
+async def sweep_delays(
+    session: aiohttp.ClientSession, lines: dict[str, dict], concurrency: int = 8
+) -> list[dict]:
+    """複数路線の遅延を同時実行数を制限しながら取得し、最大遅延の大きい順に返す
+
+    戻り値の各要素は {"key", "line", "trains", "max_delay", "error"}。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def sweep_line(key: str, line: dict) -> dict:
+        async with semaphore:
+            try:
+                trains = await fetch_delayed_trains(session, line["pos"])
+                error = None
+            except Exception as e:
+                # 1路線の失敗でまとめ全体を失わないよう、その路線のエラーとして記録する
+                logger.warning(f"遅延情報の取得に失敗しました: {key}: {e}")
+                trains = []
+                error = str(e) or type(e).__name__
+        trains.sort(key=lambda train: train["delay_minutes"], reverse=True)
+        return {
+            "key": key,
+            "line": line,
+            "trains": trains,
+            "max_delay": trains[0]["delay_minutes"] if trains else 0,
+            "error": error,
+        }
+
+    results = await asyncio.gather(*(sweep_line(key, line) for key, line in lines.items()))
+    return sorted(results, key=lambda result: result["max_delay"], reverse=True)
+
+
+class StationMasterCache:
+    """路線ごとの駅一覧（駅コード -> 駅名）のキャッシュ
+
+    期限切れでも保持している駅一覧はそのまま返し、更新はバックグラウンドの
+    refresh_all() に任せる。未取得の路線だけはその場で取得する。
+    """
+
+    def __init__(self, ttl: float = STATION_MASTER_TTL):
+        self.ttl = ttl
+        self._entries: dict[str, tuple[dict[str, str], float]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def is_fresh(self, line_pos: str) -> bool:
+        entry = self._entries.get(line_pos)
+        return entry is not None and time.monotonic() - entry[1] < self.ttl
+
+    async def get(self, session: aiohttp.ClientSession, line_pos: str) -> dict[str, str]:
+        entry = self._entries.get(line_pos)
+        if entry is not None:
+            return entry[0]
+        return await self.refresh(session, line_pos)
+
+    async def refresh(self, session: aiohttp.ClientSession, line_pos: str) -> dict[str, str]:
+        """駅一覧を上流から取得して置き換える"""
+        lock = self._locks.setdefault(line_pos, asyncio.Lock())
+        async with lock:
+            body = await fetch_bytes(session, station_master_url(line_pos))
+            stations = await asyncio.to_thread(parse_station_master, body)
+            self._entries[line_pos] = (stations, time.monotonic())
+            return stations
+
+    async def refresh_all(
+        self,
+        session: aiohttp.ClientSession,
+        line_positions: Iterable[str],
+        concurrency: int = 4,
+        only_stale: bool = True,
+    ):
+        """複数路線の駅一覧をまとめて取得（起動時の事前読み込みと定期更新用）"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def refresh_one(line_pos: str):
+            async with semaphore:
+                try:
+                    await self.refresh(session, line_pos)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+                    logger.warning(f"駅一覧の取得に失敗しました: {line_pos}: {e}")
+
+        targets = [
+            line_pos for line_pos in dict.fromkeys(line_positions)
+            if not (only_stale and self.is_fresh(line_pos))
+        ]
+        await asyncio.gather(*(refresh_one(line_pos) for line_pos in targets))
+        logger.info(f"駅一覧を更新しました: {len(targets)}路線")
+
+
+# プロセス全体で共有する駅一覧キャッシュ
+station_masters = StationMasterCache()
+
+
+class LineCatalog:
+    """全エリアの路線をまとめた路線一覧（構築後は変更しない）
+
+    路線キーはエリアをまたいで重複しうるため "エリア:路線キー" の形で持つ。
+    """
+
+    def __init__(self, areas: dict[str, dict]):
+        self.areas = areas
+        self.lines: dict[str, dict] = {}
+        self.by_area: dict[str, tuple[str, ...]] = {}
+        self.groups: dict[str, tuple[str, tuple[str, ...]]] = {}
+        for area, lines in areas.items():
+            keys = []
+            for key, line in lines.items():
+                line_key = f"{area}:{key}"
+                self.lines[line_key] = dict(line, area=area, key=key)
+                keys.append(line_key)
+            self.by_area[area] = tuple(keys)
+            chunks = [keys[i:i + GROUP_SIZE] for i in range(0, len(keys), GROUP_SIZE)]
+            for number, chunk in enumerate(chunks, start=1):
+                group_id = area if len(chunks) == 1 else f"{area}:{number}"
+                label = AREAS.get(area, area)
+                if len(chunks) > 1:
+                    start = (number - 1) * GROUP_SIZE + 1
+                    label += f" ({start}-{start + len(chunk) - 1})"
+                self.groups[group_id] = (label, tuple(chunk))
+
+    def group_lines(self, group_id: str) -> Optional[dict[str, dict]]:
+        """グループに含まれる路線を返す（不明なグループは None）"""
+        group = self.groups.get(group_id)
+        if group is None:
+            return None
+        return {line_key: self.lines[line_key] for line_key in group[1]}
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+
+class AreaMasterRegistry:
+    """JR西日本の全エリアの路線一覧を保持し、TTLごとに再取得する
+
+    再取得した路線一覧は新しい LineCatalog を作ってから差し替えるため、
+    読み取り側は常に一貫した路線一覧を参照できる。
+    取得に失敗したエリアは前回の路線一覧を引き継ぐ。
+    """
+
+    def __init__(self, areas: Iterable[str] = AREAS, ttl: float = AREA_MASTER_TTL):
+        self.area_ids = tuple(areas)
+        self.ttl = ttl
+        self.catalog = LineCatalog({})
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl
+
+    async def _fetch_area(self, session: aiohttp.ClientSession, area: str) -> Optional[dict]:
+        try:
+            linedata = await fetch_json(session, area_master_url(area))
+            return linedata["lines"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            logger.warning(f"路線一覧の取得に失敗しました: {area}: {e}")
+            return None
+
+    async def refresh(self, session: aiohttp.ClientSession) -> LineCatalog:
+        """全エリアの路線一覧を同時に取得し、路線一覧を差し替える"""
+        async with self._lock:
+            results = await asyncio.gather(
+                *(self._fetch_area(session, area) for area in self.area_ids)
+            )
+            areas = {}
+            for area, lines in zip(self.area_ids, results):
+                if lines is None:
+                    lines = self.catalog.areas.get(area)
+                if lines:
+                    areas[area] = lines
+            self.catalog = LineCatalog(areas)
+            self.loaded_at = time.monotonic()
+            logger.info(f"路線一覧を更新しました: {len(areas)}エリア {len(self.catalog)}路線")
+            return self.catalog
+
+    async def refresh_if_stale(self, session: aiohttp.ClientSession) -> LineCatalog:
+        if self.is_stale():
+            return await self.refresh(session)
+        return self.catalog
+
+    async def ensure_loaded(self, session: aiohttp.ClientSession) -> LineCatalog:
+        """まだ一度も読み込んでいない場合だけ取得する"""
+        if self.loaded_at is None:
+            return await self.refresh(session)
+        return self.catalog
+
+
+# プロセス全体で共有する路線一覧
+area_masters = AreaMasterRegistry()
+
+
+def delay_level(delay_minutes: int) -> int:
+    """遅延分数を段階に変換（0 は遅延なし、DELAY_THRESHOLDS の何段目を超えたか）"""
+    return bisect_right(DELAY_THRESHOLDS, delay_minutes)
+
+
+class LineDelayState:
+    """路線ごとの列車の遅延段階（列車番号 -> 段階）
+
+    これまでの最大の段階だけを小さな整数で保持し、今回の列車一覧との差分から
+    状態の変化（遅延発生・遅延拡大・回復・消失）だけを返す。遅延が縮んでも
+    回復するまでは段階を下げない（同じ段階を遅延拡大として再通知しない）。
+    """
+
+    __slots__ = ("levels",)
+
+    def __init__(self, levels: Optional[dict[str, int]] = None):
+        self.levels: dict[str, int] = levels or {}
+
+    def update(self, trains: Iterable[dict]) -> list[tuple[str, dict]]:
+        """列車一覧で状態を更新し、(変化の種類, 列車) のリストを返す"""
+        transitions = []
+        levels = {}
+        seen = set()
+        for train in trains:
+            seen.add(train["no"])
+            level = delay_level(train["delay_minutes"])
+            previous = self.levels.get(train["no"], 0)
+            if level > 0:
+                levels[train["no"]] = max(level, previous)
+            if previous == 0 and level > 0:
+                transitions.append((DELAYED, train))
+            elif level > previous > 0:
+                transitions.append((WORSENED, train))
+            elif previous > 0 and level == 0:
+                transitions.append((RECOVERED, train))
+        # 走行位置から消えた列車（終着など）は遅延の終わりとして返し、状態は破棄する
+        for no in self.levels:
+            if no not in seen:
+                transitions.append((GONE, {"no": no, "delay_minutes": None, "position": None}))
+        self.levels = levels
+        return transitions
@@ -9,7 +9,6 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from env.config import Config
-from google.transit import gtfs_realtime_pb2
 
 # ロガーの設定
 logger = getLogger(__name__)
@@ -18,50 +17,178 @@ logger = getLogger(__name__)
 config = Config()
 token = config.odpt_token
 
+# 路線IDの末尾から日本語の路線名への対応表
+RAILWAY_NAMES = {
+    "Ginza": "銀座線",
+    "Marunouchi": "丸ノ内線",
+    "Hibiya": "日比谷線",
+    "Tozai": "東西線",
+    "Chiyoda": "千代田線",
+    "Yurakucho": "有楽町線",
+    "Hanzomon": "半蔵門線",
+    "Namboku": "南北線",
+    "Fukutoshin": "副都心線"
+}
+
+# 事業者ID -> 表示名
+OPERATOR_NAMES = {
+    "TokyoMetro": "東京メトロ",
+}
+
+def format_railway_name(railway: str) -> str:
+    """路線名をフォーマット"""
+    # odpt.Railway:TokyoMetro.Ginza -> 銀座線
+    if "TokyoMetro." in railway:
+        line_name = railway.split("TokyoMetro.")[-1]
+        return RAILWAY_NAMES.get(line_name, line_name + "線")
+    return railway
+
+def resolve_railway(name: str) -> Optional[str]:
+    """路線名・事業者名（銀座線 / Ginza / 東京メトロ など）を路線ID・事業者IDに変換"""
+    name = name.strip()
+    if name.startswith(("odpt.Railway:", "odpt.Operator:")):
+        return name
+    for line_name, label in RAILWAY_NAMES.items():
+        if name in (line_name, label, label.removesuffix("線")):
+            return f"odpt.Railway:TokyoMetro.{line_name}"
+    for operator, label in OPERATOR_NAMES.items():
+        if name in (operator, label):
+            return f"odpt.Operator:{operator}"
+    return None
+
+def format_subscription_target(target: str) -> str:
+    """購読対象（路線ID・事業者ID）の表示名"""
+    if target.startswith("odpt.Operator:"):
+        operator = target.split(":", 1)[1]
+        return OPERATOR_NAMES.get(operator, operator) + "（全路線）"
+    return format_railway_name(target)
+
+def parse_train_timetable(data: list) -> list:
+    """odpt:TrainTimetable のレスポンスを辞書のリストに変換"""
+    timetable = []
+    for train_info in data:
+        timetable.append(parse_train(train_info))
+    return timetable
+
+def parse_train(train_info: dict) -> dict:
+    """odpt:TrainTimetable の1列車分を辞書に変換"""
+    train_data = {
+        "date": train_info.get("dc:date"),
+        "issued": train_info.get("dct:issued"),
+        "same_as": train_info.get("owl:sameAs"),
+        "railway": train_info.get("odpt:railway"),
+        "calendar": train_info.get("odpt:calendar"),
+        "operator": train_info.get("odpt:operator"),
+        "train_type": train_info.get("odpt:trainType"),
+        "train_number": train_info.get("odpt:trainNumber"),                
+        "origin_station": train_info.get("odpt:originStation"),
+        "direction": train_info.get("odpt:railDirection"),
+        "destination_station": train_info.get("odpt:destinationStation"),
+        "stops": [],
+    }
+    
+    for stop_info in train_info.get("odpt:trainTimetableObject", []):
+        stop_data = {}
+        if "odpt:departureStation" in stop_info:
+            stop_data["station"] = stop_info["odpt:departureStation"]
+        elif "odpt:arrivalStation" in stop_info:
+            stop_data["station"] = stop_info["odpt:arrivalStation"]
+
+        if "odpt:departureTime" in stop_info:
+            stop_data["departure_time"] = stop_info["odpt:departureTime"]
+        
+        if "odpt:arrivalTime" in stop_info:
+            stop_data["arrival_time"] = stop_info["odpt:arrivalTime"]
+
+        if stop_data.get("station"):
+            train_data["stops"].append(stop_data)
+    
+    return train_data
+
+def parse_train_status(data: list) -> list:
+    """odpt:TrainInformation のレスポンスを辞書のリストに変換"""
+    status_info = []
+    for info in data:
+        status_data = {
+            "date": info.get("dc:date"),
+            "valid": info.get("dct:valid"),
+            "same_as":info.get("owl:sameAs"),
+            "railway": info.get("odpt:railway"),
+            "operator": info.get("odpt:operator"),
+            "time_of_origin": info.get("odpt:timeOfOrigin"),
+            "status": info.get("odpt:trainInformationText", {}).get("ja")
+        }
+        status_info.append(status_data)
+    return status_info
+
+def parse_train_positions(data: list) -> list:
+    """odpt:Train（列車ロケーション）のレスポンスを辞書のリストに変換"""
+    positions = []
+    for train_info in data:
+        positions.append({
+            "date": train_info.get("dc:date"),
+            "valid": train_info.get("dct:valid"),
+            "same_as": train_info.get("owl:sameAs"),
+            "railway": train_info.get("odpt:railway"),
+            "train_number": train_info.get("odpt:trainNumber"),
+            "train_type": train_info.get("odpt:trainType"),
+            "direction": train_info.get("odpt:railDirection"),
+            "from_station": train_info.get("odpt:fromStation"),
+            "to_station": train_info.get("odpt:toStation"),
+            "destination_station": train_info.get("odpt:destinationStation"),
+            "delay": train_info.get("odpt:delay") or 0,
+        })
+    return positions
+
+def parse_fare_information(data: list) -> list:
+    """odpt:RailwayFare のレスポンスを辞書のリストに変換"""
+    fare_data = []
+    for fare_info in data:
+        info = {
+            "from_station": fare_info.get("odpt:fromStation"),
+            "to_station": fare_info.get("odpt:toStation"),
+            "ic_card_fare": fare_info.get("odpt:icCardFare"),
+            "ticket_fare": fare_info.get("odpt:ticketFare"),
+            "child_ic_card_fare": fare_info.get("odpt:childIcCardFare"),
+            "child_ticket_fare": fare_info.get("odpt:childTicketFare"),
+            "operator": fare_info.get("odpt:operator"),
+            "date": fare_info.get("dc:date"),
+            "issued": fare_info.get("dct:issued"),
+            "same_as": fare_info.get("owl:sameAs"),
+        }
+        fare_data.append(info)
+    return fare_data
+
+def parse_station_information(data: list) -> list:
+    """odpt:Station のレスポンスを辞書のリストに変換"""
+    stations = []
+    for station in data:
+        station_info = {
+            "id": station.get("@id"),
+            "date": station.get("dc:date"),
+            "title": station.get("dc:title"),
+            "latitude": station.get("geo:lat"),
+            "longitude": station.get("geo:long"),
+            "same_as": station.get("owl:sameAs"),
+            "railway": station.get("odpt:railway"),
+            "operator": station.get("odpt:operator"),
+            "station_code": station.get("odpt:stationCode"),
+            "station_title": station.get("odpt:stationTitle"),
+            "passenger_survey": station.get("odpt:passengerSurvey"),
+            "station_timetable": station.get("odpt:stationTimetable"),
+            "connecting_railway": station.get("odpt:connectingRailway"),
+            "connecting_station": station.get("odpt:connectingStation"),
+        }
+        stations.append(station_info)
+    return stations
+
 def get_train_timetable():
     url= f"https://api.odpt.org/api/v4/odpt:TrainTimetable?odpt:operator=odpt.Operator:TokyoMetro&acl:consumerKey={token}"
     logger.info(f"Fetching train timetable from: {url}")
     try:
         response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
-        
-        timetable = []
-        for train_info in data:
-            train_data = {
-                "date": train_info.get("dc:date"),
-                "issued": train_info.get("dct:issued"),
-                "same_as": train_info.get("owl:sameAs"),
-                "railway": train_info.get("odpt:railway"),
-                "calendar": train_info.get("odpt:calendar"),
-                "operator": train_info.get("odpt:operator"),
-                "train_type": train_info.get("odpt:trainType"),
-                "train_number": train_info.get("odpt:trainNumber"),                
-                "origin_station": train_info.get("odpt:originStation"),
-                "direction": train_info.get("odpt:railDirection"),
-                "destination_station": train_info.get("odpt:destinationStation"),
-                "stops": [],
-            }
-            
-            for stop_info in train_info.get("odpt:trainTimetableObject", []):
-                stop_data = {}
-                if "odpt:departureStation" in stop_info:
-                    stop_data["station"] = stop_info["odpt:departureStation"]
-                elif "odpt:arrivalStation" in stop_info:
-                    stop_data["station"] = stop_info["odpt:arrivalStation"]
-
-                if "odpt:departureTime" in stop_info:
-                    stop_data["departure_time"] = stop_info["odpt:departureTime"]
-                
-                if "odpt:arrivalTime" in stop_info:
-                    stop_data["arrival_time"] = stop_info["odpt:arrivalTime"]
-
-                if stop_data.get("station"):
-                    train_data["stops"].append(stop_data)
-            
-            timetable.append(train_data)
-        
-        return timetable
+        return parse_train_timetable(response.json())
     except requests.RequestException as e:
         logger.error(f"Error fetching train timetable: {e}")
         return None
@@ -72,22 +199,7 @@ def get_train_status():
     try:
         response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
-        
-        status_info = []
-        for info in data:
-            status_data = {
-                "date": info.get("dc:date"),
-                "valid": info.get("dct:valid"),
-                "same_as":info.get("owl:sameAs"),
-                "railway": info.get("odpt:railway"),
-                "operator": info.get("odpt:operator"),
-                "time_of_origin": info.get("odpt:timeOfOrigin"),
-                "status": info.get("odpt:trainInformationText", {}).get("ja")
-            }
-            status_info.append(status_data)
-        
-        return status_info
+        return parse_train_status(response.json())
     except requests.RequestException as e:
         logger.error(f"Error fetching train status: {e}")
         return None
@@ -98,25 +210,7 @@ def get_fare_information():
     try:
         response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
-        
-        fare_data = []
-        for fare_info in data:
-            info = {
-                "from_station": fare_info.get("odpt:fromStation"),
-                "to_station": fare_info.get("odpt:toStation"),
-                "ic_card_fare": fare_info.get("odpt:icCardFare"),
-                "ticket_fare": fare_info.get("odpt:ticketFare"),
-                "child_ic_card_fare": fare_info.get("odpt:childIcCardFare"),
-                "child_ticket_fare": fare_info.get("odpt:childTicketFare"),
-                "operator": fare_info.get("odpt:operator"),
-                "date": fare_info.get("dc:date"),
-                "issued": fare_info.get("dct:issued"),
-                "same_as": fare_info.get("owl:sameAs"),
-            }
-            fare_data.append(info)
-            
-        return fare_data
+        return parse_fare_information(response.json())
     except requests.RequestException as e:
         logger.error(f"Error fetching fare information: {e}")
         return None
@@ -127,29 +221,7 @@ def get_station_information():
     try:
         response = requests.get(url)
         response.raise_for_status()
-        data = response.json()
-        
-        stations = []
-        for station in data:
-            station_info = {
-                "id": station.get("@id"),
-                "date": station.get("dc:date"),
-                "title": station.get("dc:title"),
-                "latitude": station.get("geo:lat"),
-                "longitude": station.get("geo:long"),
-                "same_as": station.get("owl:sameAs"),
-                "railway": station.get("odpt:railway"),
-                "operator": station.get("odpt:operator"),
-                "station_code": station.get("odpt:stationCode"),
-                "station_title": station.get("odpt:stationTitle"),
-                "passenger_survey": station.get("odpt:passengerSurvey"),
-                "station_timetable": station.get("odpt:stationTimetable"),
-                "connecting_railway": station.get("odpt:connectingRailway"),
-                "connecting_station": station.get("odpt:connectingStation"),
-            }
-            stations.append(station_info)
-        
-        return stations
+        return parse_station_information(response.json())
     except requests.RequestException as e:
         logger.error(f"Error fetching station information: {e}")
         return None
@@ -0,0 +1,163 @@
+import asyncio
+from logging import getLogger
+from typing import Optional
+
+import aiohttp
+
+from API.cache import ResponseCache
+from API.json_stream import iter_json_array
+from API.live_status import StatusSnapshot, live_status
+from API.TokyoMetro import (
+    token,
+    parse_train,
+    parse_train_status,
+    parse_train_positions,
+    parse_fare_information,
+    parse_station_information,
+)
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+BASE_URL = "https://api.odpt.org/api/v4"
+
+# エンドポイントごとのタイムアウト（秒）
+# 時刻表は数十MBをストリーミングで読むため、全体ではなく受信間隔で制限する
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+TIMETABLE_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=5, sock_read=30)
+
+# ストリーミング受信時のチャンクサイズ
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# エンドポイントごとのキャッシュ有効期間（秒）
+# 運賃・駅は年に数回しか変わらないため長く、運行情報は短くする
+CACHE_TTL = {
+    "odpt:RailwayFare": 24 * 60 * 60,
+    "odpt:Station": 24 * 60 * 60,
+    "odpt:TrainInformation": 60,
+    "odpt:Train": 30,
+}
+
+# 運行情報をコマンドから読むときに許容する古さ（秒）
+STATUS_MAX_AGE = 90
+
+# 運行状況ストア上のキー
+TRAIN_STATUS_KEY = "tokyo_metro:train_information"
+
+# プロセス全体で共有するレスポンスキャッシュ
+response_cache = ResponseCache(max_entries=16)
+
+# 取得失敗として扱う例外（JSONの破損はValueErrorとして送出される）
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+def _build_url(resource: str) -> str:
+    return f"{BASE_URL}/{resource}?odpt:operator=odpt.Operator:TokyoMetro&acl:consumerKey={token}"
+
+
+async def _fetch_cached(
+    resource: str,
+    parse,
+    session: Optional[aiohttp.ClientSession] = None,
+    force_refresh: bool = False,
+):
+    """キャッシュ経由でODPT APIのデータを取得し、解析済みの結果を返す"""
+    url = _build_url(resource)
+    if session is None:
+        async with aiohttp.ClientSession() as temp_session:
+            return await response_cache.fetch(
+                temp_session, resource, url, CACHE_TTL[resource], parse,
+                DEFAULT_TIMEOUT, force_refresh,
+            )
+    return await response_cache.fetch(
+        session, resource, url, CACHE_TTL[resource], parse,
+        DEFAULT_TIMEOUT, force_refresh,
+    )
+
+
+async def iter_train_timetable(session: Optional[aiohttp.ClientSession] = None):
+    """時刻表を受信しながら1列車ずつ返す（レスポンス全体は保持しない）"""
+    if session is None:
+        async with aiohttp.ClientSession() as temp_session:
+            async for train in iter_train_timetable(temp_session):
+                yield train
+        return
+
+    url = _build_url("odpt:TrainTimetable")
+    logger.info(f"Streaming odpt:TrainTimetable from: {url}")
+    async with session.get(url, timeout=TIMETABLE_TIMEOUT) as response:
+        response.raise_for_status()
+        async for train_info in iter_json_array(response.content.iter_chunked(STREAM_CHUNK_SIZE)):
+            yield parse_train(train_info)
+
+
+async def get_train_timetable(session: Optional[aiohttp.ClientSession] = None):
+    try:
+        return [train async for train in iter_train_timetable(session)]
+    except FETCH_ERRORS as e:
+        logger.error(f"Error fetching train timetable: {e}")
+        return None
+
+
+async def get_train_status(
+    session: Optional[aiohttp.ClientSession] = None, force_refresh: bool = False
+):
+    """運行情報を取得（監視タスクは force_refresh=True で常に上流を確認する）"""
+    try:
+        return await _fetch_cached(
+            "odpt:TrainInformation", parse_train_status, session, force_refresh
+        )
+    except FETCH_ERRORS as e:
+        logger.error(f"Error fetching train status: {e}")
+        return None
+
+
+async def get_train_positions(
+    session: Optional[aiohttp.ClientSession] = None, force_refresh: bool = False
+):
+    """列車ロケーション（在線位置・遅延秒数）を取得"""
+    try:
+        return await _fetch_cached(
+            "odpt:Train", parse_train_positions, session, force_refresh
+        )
+    except FETCH_ERRORS as e:
+        logger.error(f"Error fetching train positions: {e}")
+        return None
+
+
+async def get_live_train_status(
+    session: Optional[aiohttp.ClientSession] = None,
+    max_age: float = STATUS_MAX_AGE,
+    force_refresh: bool = False,
+) -> Optional[StatusSnapshot]:
+    """運行状況ストア経由で運行情報を取得（監視タスクの取得結果を共有する）"""
+    return await live_status.get(
+        TRAIN_STATUS_KEY,
+        lambda: get_train_status(session, force_refresh=True),
+        max_age,
+        force_refresh,
+    )
+
+
+async def get_fare_information(
+    session: Optional[aiohttp.ClientSession] = None, force_refresh: bool = False
+):
+    try:
+        return await _fetch_cached(
+            "odpt:RailwayFare", parse_fare_information, session, force_refresh
+        )
+    except FETCH_ERRORS as e:
+        logger.error(f"Error fetching fare information: {e}")
+        return None
+
+
+async def get_station_information(
+    session: Optional[aiohttp.ClientSession] = None, force_refresh: bool = False
+):
+    try:
+        return await _fetch_cached(
+            "odpt:Station", parse_station_information, session, force_refresh
+        )
+    except FETCH_ERRORS as e:
+        logger.error(f"Error fetching station information: {e}")
+        return None
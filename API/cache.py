@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+import aiohttp
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+
+class LRUCache:
+    """件数上限つきのLRUキャッシュ"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def put(self, key: Hashable, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def dataset_version(records: Iterable[dict], keys: tuple = ("dc:date", "dct:issued")) -> Optional[str]:
+    """レコード群の dc:date / dct:issued の最大値をデータセットのバージョンとして返す"""
+    version = None
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        for key in keys:
+            value = record.get(key)
+            if value and (version is None or value > version):
+                version = value
+    return version
+
+
+class CacheEntry:
+    __slots__ = ("data", "etag", "last_modified", "version", "expires_at")
+
+    def __init__(self, data, etag, last_modified, version, expires_at):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.version = version
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """TTLと条件付きGETによるレスポンスキャッシュ
+
+    TTL内はメモリ上の解析済みデータを返す。期限切れ後は ETag / Last-Modified で
+    再検証し、304 または dc:date が変わっていなければ解析済みデータを使い回す。
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self._entries = LRUCache(max_entries)
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key)
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """期限に関わらずキャッシュ済みのエントリを返す"""
+        return self._entries.get(key)
+
+    async def fetch(
+        self,
+        session: aiohttp.ClientSession,
+        key: Hashable,
+        url: str,
+        ttl: float,
+        parse: Callable[[Any], Any],
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        force_refresh: bool = False,
+    ):
+        entry = self._entries.get(key)
+        if entry is not None and not force_refresh and time.monotonic() < entry.expires_at:
+            return entry.data
+
+        # 同じキーへの同時リクエストは1本にまとめる
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and not force_refresh and time.monotonic() < entry.expires_at:
+                return entry.data
+            return await self._revalidate(session, key, url, ttl, parse, timeout, entry)
+
+    async def _revalidate(self, session, key, url, ttl, parse, timeout, entry: Optional[CacheEntry]):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        logger.info(f"{key}: 上流から取得します（条件付き: {bool(headers)}）")
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 304 and entry is not None:
+                logger.debug(f"{key}: 304 Not Modified")
+                entry.expires_at = time.monotonic() + ttl
+                return entry.data
+            response.raise_for_status()
+            raw = await response.json(content_type=None)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        version = dataset_version(raw) if isinstance(raw, list) else None
+        if entry is not None and version is not None and version == entry.version:
+            # 本文は届いたがデータセットは更新されていない
+            logger.debug(f"{key}: dc:date {version} は更新なし")
+            data = entry.data
+        else:
+            data = parse(raw)
+
+        self._entries.put(
+            key, CacheEntry(data, etag, last_modified, version, time.monotonic() + ttl)
+        )
+        return data
@@ -0,0 +1,235 @@
+from heapq import heapify, heappush, heappop
+from types import MappingProxyType
+from typing import Iterable, Optional
+
+from API.cache import LRUCache
+from API.timetable import Interner, NO_ID
+
+# 運賃の種類（FareGraph の辺コストの並び順）
+COST_KEYS = ("ic", "ticket", "child_ic", "child_ticket")
+ZERO_COSTS = (0, 0, 0, 0)
+
+# 東京メトロ内の乗換駅とみなす接続駅IDの接頭辞
+METRO_STATION_PREFIX = "odpt.Station:TokyoMetro"
+
+
+def _pair_key(a: int, b: int) -> int:
+    # 順序を問わない駅ペアを1つの整数キーにまとめる
+    if a > b:
+        a, b = b, a
+    return (a << 32) | b
+
+
+class FareIndex:
+    """駅ペアから運賃を引く索引（データセットのバージョンごとに1回だけ構築）"""
+
+    def __init__(self, fares: Iterable[dict], version: Optional[str] = None):
+        self.version = version
+        self.ids = Interner()
+        self._fares: dict[int, dict] = {}
+        for fare in fares:
+            if not fare:
+                continue
+            from_station = fare.get("from_station")
+            to_station = fare.get("to_station")
+            if not from_station or not to_station:
+                continue
+            key = _pair_key(self.ids.intern(from_station), self.ids.intern(to_station))
+            # 同じ駅ペアが複数ある場合は元データで先に現れたものを使う
+            self._fares.setdefault(key, fare)
+
+    def lookup(self, station_a: str, station_b: str) -> Optional[dict]:
+        """2駅間の直通運賃を返す（向きは問わない）"""
+        a = self.ids.get(station_a)
+        b = self.ids.get(station_b)
+        if a == NO_ID or b == NO_ID:
+            return None
+        return self._fares.get(_pair_key(a, b))
+
+    def find(self, from_station_ids: Iterable[str], to_station_ids: Iterable[str]) -> Optional[dict]:
+        """候補駅の組み合わせのうち、最初に見つかった直通運賃を返す"""
+        get = self.ids.get
+        to_ids = [get(station) for station in to_station_ids]
+        for from_station in from_station_ids:
+            a = get(from_station)
+            if a == NO_ID:
+                continue
+            for b in to_ids:
+                if b == NO_ID:
+                    continue
+                fare = self._fares.get(_pair_key(a, b))
+                if fare is not None:
+                    return fare
+        return None
+
+    def __len__(self) -> int:
+        return len(self._fares)
+
+
+def _station_name(station: dict) -> Optional[str]:
+    return (station.get("station_title") or {}).get("ja") or station.get("title")
+
+
+class FareGraph:
+    """運賃区間と乗換（0円）を辺に持つ駅グラフ
+
+    データセットのバージョンごとに1回だけ構築し、以降は変更しない。
+    経路探索の結果はグラフごとのLRUに保持するため、データセットが更新されて
+    グラフが作り直されるとキャッシュも破棄される。
+    """
+
+    def __init__(
+        self,
+        stations: Iterable[dict],
+        fares: Iterable[dict],
+        version=None,
+        route_cache_size: int = 256,
+    ):
+        stations = [station for station in stations if station]
+        self.version = version
+        self.ids = Interner()
+        self.name_map = MappingProxyType(self._build_name_map(stations))
+
+        adjacency: dict[int, list[tuple[int, tuple]]] = {}
+        for fare in fares:
+            if not fare:
+                continue
+            u = fare.get("from_station")
+            v = fare.get("to_station")
+            if not u or not v:
+                continue
+            costs = (
+                fare.get("ic_card_fare") or 0,
+                fare.get("ticket_fare") or 0,
+                fare.get("child_ic_card_fare") or 0,
+                fare.get("child_ticket_fare") or 0,
+            )
+            u_id = self.ids.intern(u)
+            v_id = self.ids.intern(v)
+            adjacency.setdefault(u_id, []).append((v_id, costs))
+            adjacency.setdefault(v_id, []).append((u_id, costs))
+
+        # 乗換駅情報を追加（乗換接続を0円で追加）
+        added_connections = set()
+        for station in stations:
+            station_id = station.get("same_as")
+            if not station_id:
+                continue
+            for connected_station in station.get("connecting_station") or []:
+                if not connected_station or not connected_station.startswith(METRO_STATION_PREFIX):
+                    continue
+                u_id = self.ids.intern(station_id)
+                v_id = self.ids.intern(connected_station)
+                connection_key = (min(u_id, v_id), max(u_id, v_id))
+                if connection_key in added_connections:
+                    continue
+                adjacency.setdefault(u_id, []).append((v_id, ZERO_COSTS))
+                adjacency.setdefault(v_id, []).append((u_id, ZERO_COSTS))
+                added_connections.add(connection_key)
+
+        self._adjacency: dict[int, tuple] = {
+            node: tuple(edges) for node, edges in adjacency.items()
+        }
+        self._routes = LRUCache(route_cache_size)
+
+    @staticmethod
+    def _build_name_map(stations: list) -> dict[str, str]:
+        """駅IDから駅名へのマップ（乗換先の駅は同じ駅名とみなす）"""
+        name_map = {}
+        for station in stations:
+            sid = station.get("same_as") or station.get("id")
+            name = _station_name(station)
+            if sid and name:
+                name_map[sid] = name
+            for connected_station in station.get("connecting_station") or []:
+                if (connected_station and
+                    connected_station.startswith(METRO_STATION_PREFIX) and
+                    connected_station not in name_map):
+                    name_map[connected_station] = name
+        return name_map
+
+    def __len__(self) -> int:
+        return len(self._adjacency)
+
+    def clear_route_cache(self):
+        self._routes.clear()
+
+    def find_route(
+        self, sources: Iterable[str], targets: Iterable[str], cost_key: str = "ic"
+    ) -> tuple[Optional[dict[str, int]], Optional[tuple[str, ...]]]:
+        """出発駅候補のいずれかから到着駅候補のいずれかへの最安経路を返す
+
+        cost_key の運賃で最小となる経路を1回の探索で求め、
+        (各運賃の合計, 駅IDの経路) を返す。見つからない場合は (None, None)。
+        """
+        source_ids = frozenset(self.ids.get(station) for station in sources if station) - {NO_ID}
+        target_ids = frozenset(self.ids.get(station) for station in targets if station) - {NO_ID}
+        key = (source_ids, target_ids, cost_key)
+        cached = self._routes.get(key)
+        if cached is None:
+            cached = self._search(source_ids, target_ids, COST_KEYS.index(cost_key))
+            self._routes.put(key, cached)
+        return cached
+
+    def _search(self, source_ids: frozenset, target_ids: frozenset, cost_index: int):
+        # 全出発駅を運賃0で投入する（仮想始点）、最初に確定した到着駅で終了する（仮想終点）
+        if not source_ids or not target_ids:
+            return None, None
+        dist = {}
+        parent = {}
+        totals = {}
+        heap = []
+        for source in source_ids:
+            dist[source] = 0
+            parent[source] = NO_ID
+            totals[source] = ZERO_COSTS
+            heap.append((0, source))
+        heapify(heap)
+
+        visited = set()
+        while heap:
+            cost, node = heappop(heap)
+            if node in visited:
+                continue
+            visited.add(node)
+            if node in target_ids:
+                return dict(zip(COST_KEYS, totals[node])), self._build_path(parent, node)
+            base = totals[node]
+            for nb, costs in self._adjacency.get(node, ()):
+                if nb in visited:
+                    continue
+                new_cost = cost + costs[cost_index]
+                if nb not in dist or new_cost < dist[nb]:
+                    dist[nb] = new_cost
+                    parent[nb] = node
+                    # 他の運賃も同じ経路に沿って同時に積算する
+                    totals[nb] = (
+                        base[0] + costs[0],
+                        base[1] + costs[1],
+                        base[2] + costs[2],
+                        base[3] + costs[3],
+                    )
+                    heappush(heap, (new_cost, nb))
+        return None, None
+
+    def _build_path(self, parent: dict[int, int], node: int) -> tuple[str, ...]:
+        lookup = self.ids.lookup
+        path = []
+        while node != NO_ID:
+            path.append(lookup(node))
+            node = parent[node]
+        path.reverse()
+        return tuple(path)
+
+    def route_names(self, path: Iterable[str]) -> list[str]:
+        """経路の駅名リスト（同じ駅名の連続する乗換駅は1つにまとめる）"""
+        route_names = []
+        prev_name = None
+        for station_id in path:
+            if not station_id:
+                continue
+            current_name = self.name_map.get(station_id, station_id)
+            if current_name != prev_name:
+                route_names.append(current_name)
+                prev_name = current_name
+        return route_names
@@ -0,0 +1,235 @@
+import asyncio
+import os
+from logging import getLogger
+from typing import Iterable, Optional
+
+import aiohttp
+from google.protobuf.message import DecodeError
+from google.transit import gtfs_realtime_pb2
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+
+# 取得失敗として扱う例外（壊れたフィードは DecodeError として送出される）
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError, DecodeError)
+
+FULL_DATASET = gtfs_realtime_pb2.FeedHeader.FULL_DATASET
+DIFFERENTIAL = gtfs_realtime_pb2.FeedHeader.DIFFERENTIAL
+
+
+def _translated(text) -> Optional[str]:
+    """TranslatedString から日本語（無ければ最初の言語）の文字列を取り出す"""
+    fallback = None
+    for translation in text.translation:
+        if translation.language in ("ja", "ja-JP"):
+            return translation.text
+        if fallback is None:
+            fallback = translation.text
+    return fallback
+
+
+class TripUpdateRecord:
+    """TripUpdate 1件分（停車駅ごとの遅延は (駅ID, 到着遅延秒, 発車遅延秒) のタプル）"""
+
+    __slots__ = ("trip_id", "route_id", "start_date", "vehicle_id", "delay", "timestamp", "stops")
+
+    def __init__(self, trip_update):
+        trip = trip_update.trip
+        self.trip_id = trip.trip_id or None
+        self.route_id = trip.route_id or None
+        self.start_date = trip.start_date or None
+        self.vehicle_id = trip_update.vehicle.id or None
+        self.delay = trip_update.delay if trip_update.HasField("delay") else None
+        self.timestamp = trip_update.timestamp or None
+        self.stops = tuple(
+            (
+                stop.stop_id or None,
+                stop.arrival.delay if stop.HasField("arrival") else None,
+                stop.departure.delay if stop.HasField("departure") else None,
+            )
+            for stop in trip_update.stop_time_update
+        )
+
+    @property
+    def max_delay(self) -> int:
+        """停車駅ごとの遅延のうち最大のもの（秒）"""
+        delays = [self.delay or 0]
+        for _, arrival, departure in self.stops:
+            delays.append(arrival or 0)
+            delays.append(departure or 0)
+        return max(delays)
+
+
+class VehiclePositionRecord:
+    """VehiclePosition 1件分"""
+
+    __slots__ = (
+        "trip_id", "route_id", "vehicle_id", "latitude", "longitude",
+        "bearing", "stop_id", "status", "timestamp",
+    )
+
+    def __init__(self, vehicle):
+        self.trip_id = vehicle.trip.trip_id or None
+        self.route_id = vehicle.trip.route_id or None
+        self.vehicle_id = vehicle.vehicle.id or None
+        position = vehicle.position if vehicle.HasField("position") else None
+        self.latitude = position.latitude if position else None
+        self.longitude = position.longitude if position else None
+        self.bearing = position.bearing if position and position.HasField("bearing") else None
+        self.stop_id = vehicle.stop_id or None
+        self.status = vehicle.current_status if vehicle.HasField("current_status") else None
+        self.timestamp = vehicle.timestamp or None
+
+
+class AlertRecord:
+    """Alert 1件分（影響範囲は路線ID・駅IDのタプル）"""
+
+    __slots__ = ("route_ids", "stop_ids", "cause", "effect", "active_periods", "header", "description")
+
+    def __init__(self, alert):
+        self.route_ids = tuple(dict.fromkeys(e.route_id for e in alert.informed_entity if e.route_id))
+        self.stop_ids = tuple(dict.fromkeys(e.stop_id for e in alert.informed_entity if e.stop_id))
+        self.cause = alert.cause
+        self.effect = alert.effect
+        self.active_periods = tuple((period.start or None, period.end or None) for period in alert.active_period)
+        self.header = _translated(alert.header_text)
+        self.description = _translated(alert.description_text)
+
+
+def decode_feed(body: bytes) -> gtfs_realtime_pb2.FeedMessage:
+    """GTFS-RT のバイナリを FeedMessage に復号"""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(body)
+    return feed
+
+
+class GtfsRealtimeState:
+    """GTFS-RT フィードの現在の状態（エンティティID -> レコード）
+
+    FULL_DATASET は全件を置き換え、DIFFERENTIAL は差分だけを反映する。
+    1つのフィードに TripUpdate・VehiclePosition・Alert が混在していてもよい。
+    """
+
+    def __init__(self):
+        self.trip_updates: dict[str, TripUpdateRecord] = {}
+        self.vehicles: dict[str, VehiclePositionRecord] = {}
+        self.alerts: dict[str, AlertRecord] = {}
+        self.timestamp: Optional[int] = None
+
+    def apply(self, feed: gtfs_realtime_pb2.FeedMessage) -> tuple[set[str], set[str]]:
+        """フィードを反映し、(更新されたエンティティID, 削除されたエンティティID) を返す"""
+        header = feed.header
+        if header.timestamp and self.timestamp and header.timestamp < self.timestamp:
+            # 前回より古いフィードは無視する
+            logger.debug(f"古いGTFS-RTフィードを無視しました: {header.timestamp}")
+            return set(), set()
+
+        full = header.incrementality != DIFFERENTIAL
+        previous_ids = self._entity_ids() if full else set()
+        if full:
+            self.trip_updates = {}
+            self.vehicles = {}
+            self.alerts = {}
+
+        updated = set()
+        deleted = set()
+        for entity in feed.entity:
+            if entity.is_deleted:
+                self._remove(entity.id)
+                deleted.add(entity.id)
+                continue
+            if entity.HasField("trip_update"):
+                self.trip_updates[entity.id] = TripUpdateRecord(entity.trip_update)
+            if entity.HasField("vehicle"):
+                self.vehicles[entity.id] = VehiclePositionRecord(entity.vehicle)
+            if entity.HasField("alert"):
+                self.alerts[entity.id] = AlertRecord(entity.alert)
+            updated.add(entity.id)
+
+        if full:
+            # 全件フィードに含まれなくなったエンティティは削除されたものとみなす
+            deleted |= previous_ids - updated
+        if header.timestamp:
+            self.timestamp = header.timestamp
+        return updated, deleted
+
+    def _entity_ids(self) -> set[str]:
+        return set(self.trip_updates) | set(self.vehicles) | set(self.alerts)
+
+    def _remove(self, entity_id: str):
+        self.trip_updates.pop(entity_id, None)
+        self.vehicles.pop(entity_id, None)
+        self.alerts.pop(entity_id, None)
+
+    def alerts_for_route(self, route_id: str) -> list[AlertRecord]:
+        return [alert for alert in self.alerts.values() if route_id in alert.route_ids]
+
+    def delayed_trips(self, min_delay: int = 60) -> list[TripUpdateRecord]:
+        """min_delay 秒以上遅れている列車を遅延の大きい順に返す"""
+        trips = [trip for trip in self.trip_updates.values() if trip.max_delay >= min_delay]
+        trips.sort(key=lambda trip: trip.max_delay, reverse=True)
+        return trips
+
+
+class GtfsRealtimeSource:
+    """GTFS-RT フィードの取得元
+
+    URL の場合は HTTP で、ローカルのファイルパス（または file://）の場合は
+    ファイルから読み込む。ファイルはテスト用のフィクスチャとして使える。
+    """
+
+    def __init__(self, location: str, token: Optional[str] = None):
+        self.location = location
+        self.token = token
+        self.state = GtfsRealtimeState()
+
+    @property
+    def is_file(self) -> bool:
+        return self.location.startswith("file://") or os.path.exists(self.location)
+
+    def _url(self) -> str:
+        if not self.token:
+            return self.location
+        separator = "&" if "?" in self.location else "?"
+        return f"{self.location}{separator}acl:consumerKey={self.token}"
+
+    async def read(self, session: Optional[aiohttp.ClientSession] = None) -> bytes:
+        if self.is_file:
+            path = self.location.removeprefix("file://")
+            return await asyncio.to_thread(_read_file, path)
+        if session is None:
+            async with aiohttp.ClientSession() as temp_session:
+                return await self.read(temp_session)
+        async with session.get(self._url(), timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def poll(self, session: Optional[aiohttp.ClientSession] = None) -> Optional[tuple[set[str], set[str]]]:
+        """フィードを取得して状態に反映し、(更新ID, 削除ID) を返す（失敗時は None）"""
+        try:
+            body = await self.read(session)
+            # 復号はイベントループの外で行う
+            feed = await asyncio.to_thread(decode_feed, body)
+        except FETCH_ERRORS as e:
+            logger.error(f"GTFS-RTフィードの取得に失敗しました: {self.location}: {e}")
+            return None
+        return self.state.apply(feed)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_feed_file(path: str, entities: Iterable, incrementality: int = FULL_DATASET, timestamp: int = 0):
+    """FeedEntity のリストからフィクスチャ用のフィードファイルを作る"""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.incrementality = incrementality
+    if timestamp:
+        feed.header.timestamp = timestamp
+    feed.entity.extend(entities)
+    with open(path, "wb") as f:
+        f.write(feed.SerializeToString())
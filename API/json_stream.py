@@ -0,0 +1,81 @@
+import codecs
+import json
+import re
+from typing import AsyncIterable, AsyncIterator, Iterator
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JSONArrayParser:
+    """トップレベルのJSON配列を逐次デコードするパーサー
+
+    feed() に渡したバイト列から完成した要素だけを返し、
+    途中までしか届いていない要素はバッファに残す。
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self.finished = False
+
+    def feed(self, chunk: bytes, final: bool = False) -> Iterator:
+        buffer = self._buffer + self._text_decoder.decode(chunk, final)
+        pos = 0
+        while not self.finished:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if not self._started:
+                if char != "[":
+                    raise ValueError("JSON配列ではありません")
+                self._started = True
+                pos += 1
+                continue
+            if char == ",":
+                pos += 1
+                continue
+            if char == "]":
+                self.finished = True
+                pos += 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # 要素が次のチャンクにまたがっている
+                break
+            if not isinstance(item, (dict, list, str)):
+                # 数値などは途中で途切れていても読めてしまう（"2." が 2 になる）ため、
+                # 次の区切り（, または ]）が届くまで確定しない
+                after = _WHITESPACE.match(buffer, end).end()
+                if after < len(buffer) and buffer[after] not in ",]":
+                    if final:
+                        raise ValueError("JSON配列の要素の区切りが不正です")
+                    break
+                if after >= len(buffer) and not final:
+                    break
+            yield item
+            pos = end
+        self._buffer = buffer[pos:]
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator:
+    """バイト列のチャンクからトップレベルのJSON配列を読み、要素を1件ずつ返す
+
+    レスポンス全体をメモリに載せずに、受信した分から順にデコードする。
+    保持するのはデコード途中の要素1件分のバッファのみ。
+    """
+    parser = JSONArrayParser()
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.finished:
+            return
+    for item in parser.feed(b"", final=True):
+        yield item
+    if not parser.finished:
+        raise ValueError("JSON配列が途中で終了しました")
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+
+class StatusSnapshot:
+    """ある時点の運行状況（内容が変わるたびに version が1つ増える）"""
+
+    __slots__ = ("data", "version", "fetched_at", "changed_at")
+
+    def __init__(self, data, version: int, fetched_at: float, changed_at: float):
+        self.data = data
+        self.version = version
+        self.fetched_at = fetched_at  # 最後に上流から取得した時刻（UNIX時間）
+        self.changed_at = changed_at  # 最後に内容が変わった時刻（UNIX時間）
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class LiveStatusStore:
+    """監視タスクと対話コマンドで共有する運行状況のストア
+
+    監視タスクが取得した結果を publish() で登録し、コマンドは get() で
+    max_age 秒以内のものを読む。古い場合だけ上流に取りに行き、同じキーへの
+    同時取得は1本にまとめる。
+    """
+
+    def __init__(self):
+        self._snapshots: dict[Hashable, StatusSnapshot] = {}
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+
+    def peek(self, key: Hashable) -> Optional[StatusSnapshot]:
+        """鮮度に関わらず保持している状況を返す"""
+        return self._snapshots.get(key)
+
+    def publish(self, key: Hashable, data) -> StatusSnapshot:
+        """取得した状況を登録する（内容が前回と同じなら version は変えない）"""
+        now = time.time()
+        previous = self._snapshots.get(key)
+        if previous is not None and previous.data == data:
+            previous.fetched_at = now
+            return previous
+        version = previous.version + 1 if previous is not None else 1
+        snapshot = StatusSnapshot(data, version, now, now)
+        self._snapshots[key] = snapshot
+        return snapshot
+
+    async def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        max_age: float,
+        force_refresh: bool = False,
+        allow_stale: bool = True,
+    ) -> Optional[StatusSnapshot]:
+        """max_age 秒以内の状況を返す（無ければ fetch() で取得して登録する）
+
+        fetch() が None を返した場合は取得失敗とみなし、allow_stale なら
+        保持している古い状況を、そうでなければ None を返す。
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and not force_refresh and snapshot.age <= max_age:
+            return snapshot
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(key)
+            # 待っている間に他のタスクが取得していればそれを使う
+            if snapshot is not None and not force_refresh and snapshot.age <= max_age:
+                return snapshot
+            data = await fetch()
+            if data is None:
+                logger.warning(f"{key}: 運行状況の取得に失敗しました")
+                return snapshot if allow_stale else None
+            return self.publish(key, data)
+
+
+# プロセス全体で共有する運行状況ストア
+live_status = LiveStatusStore()
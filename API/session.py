@@ -0,0 +1,71 @@
+from logging import getLogger
+from typing import Optional
+
+import aiohttp
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+
+class SharedSession:
+    """ボット全体で共有するHTTPセッション
+
+    api.odpt.org や train-guide.westjr.co.jp への接続を使い回し、
+    リクエストごとのTLSハンドシェイクを避ける。
+    各Cogは cog_load で acquire、cog_unload で release し、
+    最後の利用者が release した時点でセッションを閉じる。
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 8,
+        keepalive_timeout: float = 60,
+        ttl_dns_cache: int = 300,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._users = 0
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers={"Accept-Encoding": "gzip, deflate"},
+            auto_decompress=True,
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """現在のセッションを取得（未作成・クローズ済みなら作り直す）"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+            logger.info("共有HTTPセッションを作成しました")
+        return self._session
+
+    async def acquire(self) -> aiohttp.ClientSession:
+        """セッションの利用を開始"""
+        self._users += 1
+        return self.session
+
+    async def release(self):
+        """セッションの利用を終了し、利用者がいなくなれば閉じる"""
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await self.close()
+
+    async def close(self):
+        """セッションを閉じる"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("共有HTTPセッションを閉じました")
+        self._session = None
@@ -0,0 +1,74 @@
+import os
+import pickle
+import struct
+import zlib
+from logging import getLogger
+from typing import Any, Optional
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# スナップショットの保存先（プロジェクトルート/data/snapshots）
+SNAPSHOT_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "snapshots")
+)
+
+# ファイル形式: MAGIC(4) + 形式バージョン(1) + バージョン文字列長(2) + バージョン文字列 + zlib圧縮したpickle
+MAGIC = b"JRSN"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">4sBH")
+
+
+def _snapshot_path(name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{name}.bin")
+
+
+def save_snapshot(name: str, version: Optional[str], data: Any):
+    """解析済みデータセットをバージョン付きでディスクに保存（一時ファイル経由で置き換え）"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    version_bytes = (version or "").encode("utf-8")
+    payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 6)
+    path = _snapshot_path(name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(version_bytes)))
+        f.write(version_bytes)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    logger.info(f"スナップショットを保存しました: {name} (version={version}, {len(payload)} bytes)")
+
+
+def _read_header(f) -> Optional[str]:
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        return None
+    magic, format_version, version_len = _HEADER.unpack(header)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        return None
+    return f.read(version_len).decode("utf-8")
+
+
+def read_snapshot_version(name: str) -> Optional[str]:
+    """スナップショットのバージョンだけを読み込む"""
+    try:
+        with open(_snapshot_path(name), "rb") as f:
+            return _read_header(f) or None
+    except OSError:
+        return None
+
+
+def load_snapshot(name: str) -> Optional[tuple[Optional[str], Any]]:
+    """スナップショットを読み込み (バージョン, データ) を返す。無い・壊れている場合は None"""
+    try:
+        with open(_snapshot_path(name), "rb") as f:
+            version = _read_header(f)
+            if version is None:
+                logger.warning(f"スナップショットの形式が不正です: {name}")
+                return None
+            data = pickle.loads(zlib.decompress(f.read()))
+        return version or None, data
+    except FileNotFoundError:
+        return None
+    except (OSError, zlib.error, pickle.UnpicklingError, EOFError) as e:
+        logger.warning(f"スナップショットの読み込みに失敗しました: {name}: {e}")
+        return None
@@ -0,0 +1,248 @@
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+# 優先して表示する路線（主要路線）
+PRIORITY_RAILWAYS = ("Ginza", "Marunouchi", "Hibiya")
+
+# 一致の種類（小さいほど優先）
+EXACT_MATCH = 1
+PREFIX_MATCH = 2
+SUBSTRING_MATCH = 3
+FUZZY_MATCH = 4
+
+# あいまい一致とみなす最小の類似度（バイグラムのDice係数）
+FUZZY_THRESHOLD = 0.5
+
+_KANA_TO_ROMAJI = {
+    "あ": "a", "い": "i", "う": "u", "え": "e", "お": "o",
+    "か": "ka", "き": "ki", "く": "ku", "け": "ke", "こ": "ko",
+    "さ": "sa", "し": "shi", "す": "su", "せ": "se", "そ": "so",
+    "た": "ta", "ち": "chi", "つ": "tsu", "て": "te", "と": "to",
+    "な": "na", "に": "ni", "ぬ": "nu", "ね": "ne", "の": "no",
+    "は": "ha", "ひ": "hi", "ふ": "fu", "へ": "he", "ほ": "ho",
+    "ま": "ma", "み": "mi", "む": "mu", "め": "me", "も": "mo",
+    "や": "ya", "ゆ": "yu", "よ": "yo",
+    "ら": "ra", "り": "ri", "る": "ru", "れ": "re", "ろ": "ro",
+    "わ": "wa", "ゐ": "i", "ゑ": "e", "を": "o", "ん": "n",
+    "が": "ga", "ぎ": "gi", "ぐ": "gu", "げ": "ge", "ご": "go",
+    "ざ": "za", "じ": "ji", "ず": "zu", "ぜ": "ze", "ぞ": "zo",
+    "だ": "da", "ぢ": "ji", "づ": "zu", "で": "de", "ど": "do",
+    "ば": "ba", "び": "bi", "ぶ": "bu", "べ": "be", "ぼ": "bo",
+    "ぱ": "pa", "ぴ": "pi", "ぷ": "pu", "ぺ": "pe", "ぽ": "po",
+    "ゔ": "vu",
+    "ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o",
+    "ゃ": "ya", "ゅ": "yu", "ょ": "yo", "ゎ": "wa",
+}
+
+_MACRONS = str.maketrans("āīūēōâîûêô", "aiueoaiueo")
+_IGNORED_CHARS = re.compile(r"[\s\-‐ー―・'’.,()（）]")
+_LONG_VOWELS = re.compile(r"o[ou]|uu")
+_NASAL_M = re.compile(r"m(?=[bpm])")
+
+
+def katakana_to_hiragana(text: str) -> str:
+    return "".join(
+        chr(ord(char) - 0x60) if "ァ" <= char <= "ヶ" else char for char in text
+    )
+
+
+def normalize(text: str) -> str:
+    """表記ゆれを吸収した検索キー（全角半角・大文字小文字・カタカナを統一）"""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_MACRONS)
+    text = _IGNORED_CHARS.sub("", text)
+    return katakana_to_hiragana(text)
+
+
+def kana_to_romaji(text: str) -> str:
+    """ひらがなをヘボン式ローマ字に変換（かな以外はそのまま）"""
+    result = []
+    i = 0
+    double_next = False
+    while i < len(text):
+        char = text[i]
+        if char == "っ":
+            double_next = True
+            i += 1
+            continue
+        romaji = _KANA_TO_ROMAJI.get(char, char)
+        # 拗音（きゃ・しゅ など）
+        if i + 1 < len(text) and text[i + 1] in "ゃゅょ" and romaji.endswith("i") and len(romaji) > 1:
+            small = _KANA_TO_ROMAJI[text[i + 1]]
+            if romaji in ("shi", "chi", "ji"):
+                romaji = romaji[:-1] + small[1:]
+            else:
+                romaji = romaji[:-1] + small
+            i += 1
+        if double_next and romaji[:1].isalpha():
+            romaji = ("t" if romaji.startswith("ch") else romaji[0]) + romaji
+        double_next = False
+        result.append(romaji)
+        i += 1
+    return "".join(result)
+
+
+def romaji_key(text: str) -> str:
+    """ローマ字表記の揺れ（長音・撥音の m/n など）を吸収したキー"""
+    text = re.sub(r"[^a-z]", "", normalize(text))
+    text = _LONG_VOWELS.sub(lambda m: m.group(0)[0], text)
+    return _NASAL_M.sub("n", text)
+
+
+def _is_kana(text: str) -> bool:
+    return bool(text) and all("ぁ" <= char <= "ゖ" for char in text)
+
+
+def _is_latin(text: str) -> bool:
+    return bool(text) and all("a" <= char <= "z" for char in text)
+
+
+def query_keys(query: str) -> set[str]:
+    """入力文字列から照合に使うキーを作る（かな・ローマ字はローマ字キーも追加）"""
+    normalized = normalize(query)
+    keys = {normalized} if normalized else set()
+    if _is_kana(normalized):
+        keys.add(romaji_key(kana_to_romaji(normalized)))
+    elif _is_latin(normalized):
+        keys.add(romaji_key(normalized))
+    keys.discard("")
+    return keys
+
+
+def _ngrams(text: str) -> set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class StationEntry:
+    __slots__ = ("name", "id", "railway", "railway_priority", "keys")
+
+    def __init__(self, name: str, station_id: Optional[str], railway: str, keys: tuple[str, ...]):
+        self.name = name
+        self.id = station_id
+        self.railway = railway
+        self.railway_priority = 0 if any(line in railway for line in PRIORITY_RAILWAYS) else 1
+        self.keys = keys
+
+
+class StationIndex:
+    """駅名検索用の索引
+
+    駅名・読み仮名・英語名を正規化したキーを、前方一致用のトライ木と
+    部分一致・あいまい一致用のn-gram転置索引に登録する。
+    """
+
+    def __init__(self, stations: Iterable[dict]):
+        self.entries: list[StationEntry] = []
+        self._trie: dict = {}
+        self._postings: dict[str, set[int]] = {}
+        self._by_name: dict[str, list[int]] = {}
+        self._by_id: dict[str, int] = {}
+
+        for station in stations:
+            if not station:
+                continue
+            title = station.get("station_title") or {}
+            name = title.get("ja") or station.get("title")
+            if not name:
+                continue
+            entry = StationEntry(
+                name, station.get("same_as"), station.get("railway") or "", self._station_keys(name, title)
+            )
+            index = len(self.entries)
+            self.entries.append(entry)
+            self._by_name.setdefault(name, []).append(index)
+            if entry.id:
+                self._by_id[entry.id] = index
+            for key in entry.keys:
+                self._add_to_trie(key, index)
+                # 1文字の入力にも対応するため、1文字単位でも登録する
+                for gram in _ngrams(key) | set(key):
+                    self._postings.setdefault(gram, set()).add(index)
+
+    @staticmethod
+    def _station_keys(name: str, title: dict) -> tuple[str, ...]:
+        keys = [normalize(name)]
+        for lang, value in title.items():
+            if not value or lang == "ja":
+                continue
+            if lang.startswith("ja"):
+                # 読み仮名（ja-Hrkt など）
+                reading = normalize(value)
+                keys.append(reading)
+                keys.append(romaji_key(kana_to_romaji(reading)))
+            elif lang == "en":
+                keys.append(romaji_key(value))
+        return tuple(dict.fromkeys(key for key in keys if key))
+
+    def _add_to_trie(self, key: str, index: int):
+        node = self._trie
+        for char in key:
+            node = node.setdefault(char, {})
+            node.setdefault("", set()).add(index)
+
+    def _prefix_matches(self, key: str) -> set[int]:
+        node = self._trie
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get("", set())
+
+    def get(self, station_id: str) -> Optional[StationEntry]:
+        index = self._by_id.get(station_id)
+        return None if index is None else self.entries[index]
+
+    def same_name(self, name: str) -> list[StationEntry]:
+        """同じ駅名の全路線の駅を返す"""
+        return [self.entries[index] for index in self._by_name.get(name, [])]
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[tuple[tuple, StationEntry]]:
+        """入力に一致する駅を (優先度, 駅) の優先度順で返す"""
+        best: dict[int, tuple] = {}
+
+        def update(index: int, rank: tuple):
+            if index not in best or rank < best[index]:
+                best[index] = rank
+
+        for key in query_keys(query):
+            # 完全一致・前方一致（トライ木）
+            for index in self._prefix_matches(key):
+                entry = self.entries[index]
+                match = EXACT_MATCH if key in entry.keys else PREFIX_MATCH
+                update(index, (match, entry.railway_priority))
+
+            grams = _ngrams(key)
+            postings = [self._postings.get(gram, set()) for gram in grams]
+            if not postings:
+                continue
+
+            # 部分一致（n-gramの積集合を候補にして確認）
+            for index in set.intersection(*postings):
+                entry = self.entries[index]
+                if any(key in entry_key for entry_key in entry.keys):
+                    update(index, (SUBSTRING_MATCH, entry.railway_priority))
+
+            # あいまい一致（n-gramの重なりによる類似度）
+            if len(grams) < 2:
+                continue
+            for index in set().union(*postings):
+                if index in best:
+                    continue
+                entry = self.entries[index]
+                similarity = max(
+                    2 * len(grams & _ngrams(entry_key)) / (len(grams) + len(_ngrams(entry_key)))
+                    for entry_key in entry.keys
+                )
+                if similarity >= FUZZY_THRESHOLD:
+                    update(index, (FUZZY_MATCH, -round(similarity, 3), entry.railway_priority))
+
+        results = sorted(
+            ((rank, self.entries[index]) for index, rank in best.items()),
+            key=lambda item: (item[0], item[1].name),
+        )
+        return results[:limit] if limit else results
+
+    def __len__(self) -> int:
+        return len(self.entries)
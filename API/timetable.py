@@ -0,0 +1,249 @@
+from array import array
+from bisect import bisect_left
+from typing import AsyncIterable, Iterable, Iterator, Optional
+
+# 運行日の切り替え時刻（これより前の時刻は前日の運行日の続きとして扱う）
+SERVICE_DAY_START = 3 * 60
+MINUTES_PER_DAY = 24 * 60
+
+# 時刻が無いことを表す値
+NO_TIME = 0xFFFF
+# IDが無いことを表す値
+NO_ID = 0xFFFFFFFF
+
+
+def time_to_minutes(value: Optional[str]) -> int:
+    """"HH:MM" を運行日開始からの分に変換（深夜帯は24時以降として扱う）"""
+    if not value:
+        return NO_TIME
+    hour, minute = value.split(":")[:2]
+    minutes = int(hour) * 60 + int(minute)
+    if minutes < SERVICE_DAY_START:
+        minutes += MINUTES_PER_DAY
+    return minutes
+
+
+def minutes_to_time(minutes: int) -> Optional[str]:
+    """運行日開始からの分を "HH:MM" に戻す"""
+    if minutes == NO_TIME:
+        return None
+    minutes %= MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class Interner:
+    """文字列IDと整数IDの相互変換表"""
+
+    __slots__ = ("_ids", "_values")
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._values: list[str] = []
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_ID
+        interned = self._ids.get(value)
+        if interned is None:
+            interned = len(self._values)
+            self._ids[value] = interned
+            self._values.append(value)
+        return interned
+
+    def get(self, value: Optional[str]) -> int:
+        """登録済みの整数IDを返す（未登録なら NO_ID）"""
+        if value is None:
+            return NO_ID
+        return self._ids.get(value, NO_ID)
+
+    def lookup(self, interned: int) -> Optional[str]:
+        if interned == NO_ID:
+            return None
+        return self._values[interned]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class TrainRecord:
+    """1列車分の時刻表（停車駅は CompactTimetable の配列上の範囲で持つ）"""
+
+    __slots__ = (
+        "timetable",
+        "same_as",
+        "train_number",
+        "railway",
+        "calendar",
+        "operator",
+        "train_type",
+        "origin_station",
+        "direction",
+        "destination_station",
+        "date",
+        "issued",
+        "start",
+        "end",
+    )
+
+    def __init__(self, timetable: "CompactTimetable", train: dict, start: int, end: int):
+        ids = timetable.ids
+        self.timetable = timetable
+        self.same_as = train.get("same_as")
+        self.train_number = train.get("train_number")
+        self.railway = ids.intern(train.get("railway"))
+        self.calendar = ids.intern(train.get("calendar"))
+        self.operator = ids.intern(train.get("operator"))
+        self.train_type = ids.intern(train.get("train_type"))
+        self.origin_station = _intern_list(ids, train.get("origin_station"))
+        self.direction = ids.intern(train.get("direction"))
+        self.destination_station = _intern_list(ids, train.get("destination_station"))
+        self.date = ids.intern(train.get("date"))
+        self.issued = ids.intern(train.get("issued"))
+        self.start = start
+        self.end = end
+
+    def stops(self) -> Iterator[tuple[int, int, int]]:
+        """(駅ID, 発車分, 到着分) を停車順に返す"""
+        tt = self.timetable
+        for i in range(self.start, self.end):
+            yield tt.stop_station[i], tt.stop_departure[i], tt.stop_arrival[i]
+
+    def to_dict(self) -> dict:
+        """get_train_timetable() と同じ辞書形式に変換"""
+        lookup = self.timetable.ids.lookup
+        stops = []
+        for station, departure, arrival in self.stops():
+            stop = {"station": lookup(station)}
+            if departure != NO_TIME:
+                stop["departure_time"] = minutes_to_time(departure)
+            if arrival != NO_TIME:
+                stop["arrival_time"] = minutes_to_time(arrival)
+            stops.append(stop)
+        return {
+            "date": lookup(self.date),
+            "issued": lookup(self.issued),
+            "same_as": self.same_as,
+            "railway": lookup(self.railway),
+            "calendar": lookup(self.calendar),
+            "operator": lookup(self.operator),
+            "train_type": lookup(self.train_type),
+            "train_number": self.train_number,
+            "origin_station": _lookup_list(lookup, self.origin_station),
+            "direction": lookup(self.direction),
+            "destination_station": _lookup_list(lookup, self.destination_station),
+            "stops": stops,
+        }
+
+
+def _intern_list(ids: Interner, values):
+    # 始発駅・行先は配列で提供されるため、整数IDのタプルで保持
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return ids.intern(values)
+    return tuple(ids.intern(value) for value in values)
+
+
+def _lookup_list(lookup, values):
+    if values is None:
+        return None
+    if isinstance(values, int):
+        return lookup(values)
+    return [lookup(value) for value in values]
+
+
+class CompactTimetable:
+    """配列ベースの時刻表
+
+    駅・路線などのIDは整数に置き換え、停車駅の時刻は運行日開始からの分として
+    型付き配列にまとめて保持する。辞書形式が必要な場合は TrainRecord.to_dict() で変換する。
+    """
+
+    def __init__(self):
+        self.ids = Interner()
+        self.trains: list[TrainRecord] = []
+        self.stop_station = array("I")
+        self.stop_departure = array("H")
+        self.stop_arrival = array("H")
+        self.stop_train = array("I")
+        # 駅ID -> (発車分の配列, 停車位置の配列)。発車時刻順に並ぶ
+        self._departure_index: Optional[dict[int, tuple[array, array]]] = None
+
+    def add_train(self, train: dict):
+        """get_train_timetable() 形式の1列車を追加"""
+        start = len(self.stop_station)
+        train_index = len(self.trains)
+        for stop in train.get("stops", []):
+            self.stop_station.append(self.ids.intern(stop.get("station")))
+            self.stop_departure.append(time_to_minutes(stop.get("departure_time")))
+            self.stop_arrival.append(time_to_minutes(stop.get("arrival_time")))
+            self.stop_train.append(train_index)
+        self.trains.append(TrainRecord(self, train, start, len(self.stop_station)))
+        self._departure_index = None
+
+    @classmethod
+    def from_trains(cls, trains: Iterable[dict]) -> "CompactTimetable":
+        timetable = cls()
+        for train in trains:
+            timetable.add_train(train)
+        return timetable
+
+    @classmethod
+    async def from_async_trains(cls, trains: AsyncIterable[dict]) -> "CompactTimetable":
+        """iter_train_timetable() から受信しながら構築"""
+        timetable = cls()
+        async for train in trains:
+            timetable.add_train(train)
+        return timetable
+
+    def _build_departure_index(self) -> dict[int, tuple[array, array]]:
+        positions: dict[int, list[int]] = {}
+        departure = self.stop_departure
+        for i, station in enumerate(self.stop_station):
+            if departure[i] != NO_TIME:
+                positions.setdefault(station, []).append(i)
+        index = {}
+        for station, stop_positions in positions.items():
+            stop_positions.sort(key=departure.__getitem__)
+            index[station] = (
+                array("H", (departure[i] for i in stop_positions)),
+                array("I", stop_positions),
+            )
+        return index
+
+    def departures(
+        self,
+        station: str,
+        after: Optional[str] = None,
+        calendar: Optional[str] = None,
+        railway: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[tuple[str, TrainRecord]]:
+        """駅の発車時刻表を返す [("HH:MM", 列車), ...]"""
+        if self._departure_index is None:
+            self._departure_index = self._build_departure_index()
+        entry = self._departure_index.get(self.ids.get(station))
+        if entry is None:
+            return []
+        times, positions = entry
+        calendar_id = self.ids.get(calendar) if calendar else None
+        railway_id = self.ids.get(railway) if railway else None
+
+        results = []
+        i = bisect_left(times, time_to_minutes(after)) if after else 0
+        while i < len(times) and len(results) < limit:
+            train = self.trains[self.stop_train[positions[i]]]
+            if (calendar_id is None or train.calendar == calendar_id) and (
+                railway_id is None or train.railway == railway_id
+            ):
+                results.append((minutes_to_time(times[i]), train))
+            i += 1
+        return results
+
+    def to_dicts(self) -> Iterator[dict]:
+        """全列車を get_train_timetable() と同じ辞書形式で順に返す"""
+        for train in self.trains:
+            yield train.to_dict()
+
+    def __len__(self) -> int:
+        return len(self.trains)
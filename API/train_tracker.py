@@ -0,0 +1,178 @@
+import inspect
+from array import array
+from logging import getLogger
+from typing import Any, Callable, Iterable, Optional
+
+import aiohttp
+
+from API.TokyoMetroAsync import get_train_positions
+from API.timetable import Interner
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 空きスロットを表す値
+FREE_SLOT = 0
+
+
+class TrainDelta:
+    """1回の取得で変化した列車
+
+    appeared / disappeared は列車の辞書、moved は (列車, (前回の出発駅, 前回の到着駅))、
+    delay_changed は (列車, 前回の遅延秒数) のリスト。
+    """
+
+    __slots__ = ("appeared", "moved", "delay_changed", "disappeared", "generation")
+
+    def __init__(self, generation: int):
+        self.appeared: list[dict] = []
+        self.moved: list[tuple[dict, tuple[Optional[str], Optional[str]]]] = []
+        self.delay_changed: list[tuple[dict, int]] = []
+        self.disappeared: list[dict] = []
+        self.generation = generation
+
+    def __bool__(self) -> bool:
+        return bool(self.appeared or self.moved or self.delay_changed or self.disappeared)
+
+    def __repr__(self) -> str:
+        return (
+            f"TrainDelta(appeared={len(self.appeared)}, moved={len(self.moved)}, "
+            f"delay_changed={len(self.delay_changed)}, disappeared={len(self.disappeared)})"
+        )
+
+
+def train_key(train: dict) -> Optional[str]:
+    """列車を識別するキー（owl:sameAs、無ければ 路線 + 列車番号）"""
+    if train.get("same_as"):
+        return train["same_as"]
+    if train.get("railway") and train.get("train_number"):
+        return f"{train['railway']}:{train['train_number']}"
+    return None
+
+
+class TrainPositionTable:
+    """列車ごとの在線状態の表
+
+    列車はキーごとにスロット番号を割り当て、駅IDは整数に置き換えて
+    型付き配列で保持する。消えた列車のスロットは再利用する。
+    """
+
+    def __init__(self):
+        self.ids = Interner()
+        self._slots: dict[str, int] = {}
+        self._free: list[int] = []
+        self.trains: list[Optional[dict]] = []  # スロットごとの最新の列車
+        self.from_station = array("I")
+        self.to_station = array("I")
+        self.delay = array("i")
+        self.seen = array("I")  # 最後に現れた世代（0 は空きスロット）
+        self.generation = 0
+
+    def _allocate(self, key: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self.trains)
+            self.trains.append(None)
+            self.from_station.append(0)
+            self.to_station.append(0)
+            self.delay.append(0)
+            self.seen.append(FREE_SLOT)
+        self._slots[key] = slot
+        return slot
+
+    def update(self, trains: Iterable[dict]) -> TrainDelta:
+        """今回の列車一覧を反映し、前回からの差分を返す"""
+        self.generation += 1
+        generation = self.generation
+        delta = TrainDelta(generation)
+        intern = self.ids.intern
+        lookup = self.ids.lookup
+
+        for train in trains:
+            key = train_key(train)
+            if key is None:
+                continue
+            from_station = intern(train.get("from_station"))
+            to_station = intern(train.get("to_station"))
+            delay = train.get("delay") or 0
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._allocate(key)
+                delta.appeared.append(train)
+            elif self.seen[slot] != generation:
+                if self.from_station[slot] != from_station or self.to_station[slot] != to_station:
+                    delta.moved.append(
+                        (train, (lookup(self.from_station[slot]), lookup(self.to_station[slot])))
+                    )
+                if self.delay[slot] != delay:
+                    delta.delay_changed.append((train, self.delay[slot]))
+            self.trains[slot] = train
+            self.from_station[slot] = from_station
+            self.to_station[slot] = to_station
+            self.delay[slot] = delay
+            self.seen[slot] = generation
+
+        for key, slot in list(self._slots.items()):
+            if self.seen[slot] != generation:
+                delta.disappeared.append(self.trains[slot])
+                del self._slots[key]
+                self.trains[slot] = None
+                self.seen[slot] = FREE_SLOT
+                self._free.append(slot)
+        return delta
+
+    def get(self, key: str) -> Optional[dict]:
+        slot = self._slots.get(key)
+        return None if slot is None else self.trains[slot]
+
+    def __iter__(self):
+        for slot in self._slots.values():
+            yield self.trains[slot]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class TrainTracker:
+    """列車ロケーションを取得して差分を購読者に配る"""
+
+    def __init__(self):
+        self.table = TrainPositionTable()
+        self._subscribers: list[Callable[[TrainDelta], Any]] = []
+        self._last_data = None
+
+    def subscribe(self, callback: Callable[[TrainDelta], Any]) -> Callable[[], None]:
+        """差分を受け取る関数（async も可）を登録し、登録解除用の関数を返す"""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    async def poll(
+        self, session: Optional[aiohttp.ClientSession] = None, force_refresh: bool = True
+    ) -> Optional[TrainDelta]:
+        """列車ロケーションを取得して反映し、差分を返す（取得失敗時は None）"""
+        trains = await get_train_positions(session, force_refresh)
+        if trains is None:
+            return None
+        if trains is self._last_data:
+            # dc:date が変わっておらず、解析済みデータがそのまま返された
+            return TrainDelta(self.table.generation)
+        self._last_data = trains
+        delta = self.table.update(trains)
+        if delta:
+            await self._publish(delta)
+        return delta
+
+    async def _publish(self, delta: TrainDelta):
+        for callback in list(self._subscribers):
+            try:
+                result = callback(delta)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"列車位置の差分の処理でエラーが発生しました: {e}")
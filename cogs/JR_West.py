@@ -1,79 +1,141 @@
+import asyncio
 import json
 import traceback
 from typing import Optional
+import aiohttp
 import discord
-import requests
-from discord.ext import commands
-from requests.exceptions import RequestException
+from aiohttp import ClientError
+from discord.ext import commands, tasks
+from logging import getLogger
 
+from API.JRWest import (
+    AREAS,
+    area_masters,
+    fetch_delayed_trains,
+    format_delayed_train,
+    station_masters,
+    sweep_delays,
+)
 
-async def get_delay_info(line_pos: str, line_name: str, line_range: str) -> str:
-    """Fetches and formats delay information for a given train line."""
-    try:
-        content = f"**{line_name}({line_range})**\n"
-        url = f"https://www.train-guide.westjr.co.jp{line_pos}"
-        url_st = url.replace(".json", "_st.json")
-
-        res = requests.get(url)
-        res_st = requests.get(url_st)
-        res.raise_for_status()
-        res_st.raise_for_status()
-
-        data = res.json()
-        data_st = res_st.json()
-
-        dictst = {
-            station["info"]["code"]: station["info"]["name"]
-            for station in data_st["stations"]
-        }
-
-        delay_messages = []
-        for item in data["trains"]:
-            if item["delayMinutes"] > 0:
-                stn = item["pos"].split("_")
-                try:
-                    position = dictst[stn[0]] + "辺り"
-                except KeyError:
-                    position = "どこかよくわかんない"
-
-                tc = item.get("typeChange", "")
-                if tc == " ":
-                    tc = ""
-
-                display_type = item["displayType"]
-                if display_type.endswith("○"):
-                    display_type = display_type[:-1] + "速"
-
-                dest_text = (
-                    item["dest"]["text"]
-                    if isinstance(item["dest"], dict)
-                    else item["dest"]
-                )
-                delay_messages.append(
-                    f"{display_type} {dest_text}行き {tc} {item['no']} {item['delayMinutes']}分遅れ {position}"
-                )
+# ロガーの設定
+logger = getLogger(__name__)
 
-        if delay_messages:
-            content += "\n".join(delay_messages)
-        else:
-            content += "現在、遅延情報はありません。"
 
-        return content
+# 遅延まとめの1ページあたりの路線数
+SUMMARY_LINES_PER_PAGE = 8
+
+# 遅延まとめのフッターの文字数の上限（取得に失敗した路線名はこれに収まるよう省略する）
+SUMMARY_FOOTER_CHARS = 200
+
+# 遅延まとめの1ページあたりの文字数の上限（Embedの上限6000文字からフッター分を除く）
+SUMMARY_PAGE_CHARS = 6000 - SUMMARY_FOOTER_CHARS
+
 
-    except RequestException as err:
+def format_delay_info(trains: list[dict], line_name: str, line_range: str) -> str:
+    """遅れている列車の一覧から遅延情報のメッセージを作成する"""
+    content = f"**{line_name}({line_range})**\n"
+    if trains:
+        content += "\n".join(format_delayed_train(train) for train in trains)
+    else:
+        content += "現在、遅延情報はありません。"
+    return content
+
+
+async def get_delay_info(
+    session: aiohttp.ClientSession, line_pos: str, line_name: str, line_range: str
+) -> str:
+    """Fetches and formats delay information for a given train line."""
+    try:
+        trains = await fetch_delayed_trains(session, line_pos)
+        return format_delay_info(trains, line_name, line_range)
+
+    except (ClientError, asyncio.TimeoutError) as err:
         return f"HTTPError: {err}"
     except json.JSONDecodeError as err:
         return f"JSONDecodeError: {err}"
 
 
+def build_summary_pages(area_name: str, results: list[dict]) -> list[discord.Embed]:
+    """エリア全体の遅延まとめをページごとのEmbedに分割する"""
+    delayed = [result for result in results if result["trains"]]
+    failed = [result for result in results if result["error"]]
+
+    def new_page() -> discord.Embed:
+        return discord.Embed(
+            title=f"🚃 {area_name} 遅延まとめ",
+            description=f"遅延のある路線: {len(delayed)} / {len(results)}",
+            color=discord.Color.orange() if delayed else discord.Color.green(),
+        )
+
+    embed = new_page()
+    pages = [embed]
+    for result in delayed:
+        line = result["line"]
+        lines = [format_delayed_train(train) for train in result["trains"]]
+        value = "\n".join(lines)
+        if len(value) > 1024:
+            value = value[:1000].rsplit("\n", 1)[0] + "\n…"
+        name = f"{line['name']}({line['range']}) 最大{result['max_delay']}分遅れ"
+        # 路線数か文字数（フッター分を残す）が上限を超える場合は次のページにする
+        if embed.fields and (
+            len(embed.fields) >= SUMMARY_LINES_PER_PAGE
+            or len(embed) + len(name) + len(value) > SUMMARY_PAGE_CHARS
+        ):
+            embed = new_page()
+            pages.append(embed)
+        embed.add_field(name=name, value=value, inline=False)
+    if not delayed:
+        embed.add_field(name="運行状況", value="現在、遅延情報はありません。", inline=False)
+
+    footer = ""
+    if failed:
+        label = f"取得に失敗した路線（{len(failed)}）: "
+        names = "、".join(f"{result['line']['name']}({result['line']['range']})" for result in failed)
+        # ページ番号の分を残してフッターに収まらない路線名は省略する
+        limit = SUMMARY_FOOTER_CHARS - 20 - len(label)
+        if len(names) > limit:
+            names = names[:limit - 1] + "…"
+        footer = f"{label}{names} / "
+    for number, embed in enumerate(pages, start=1):
+        embed.set_footer(text=f"{footer}{number}/{len(pages)}ページ")
+    return pages
+
+
+class SummaryPaginator(discord.ui.View):
+    """遅延まとめのページ送り"""
+
+    def __init__(self, pages: list[discord.Embed]):
+        super().__init__(timeout=300)
+        self.pages = pages
+        self.page = 0
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= len(self.pages) - 1
+
+    @discord.ui.button(label="前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.pages[self.page], view=self)
+
+    @discord.ui.button(label="次へ", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(len(self.pages) - 1, self.page + 1)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.pages[self.page], view=self)
+
+
 class LineSelect(discord.ui.Select):
-    def __init__(self, lines):
+    def __init__(self, lines, session: aiohttp.ClientSession):
         options = [
             discord.SelectOption(label=f"{line['name']}({line['range']})", value=key)
             for key, line in lines.items()
         ]
         super().__init__(placeholder="路線を選択してください", options=options)
         self.lines = lines
+        self.session = session
 
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
@@ -84,65 +146,59 @@ class LineSelect(discord.ui.Select):
         line_name = selected_line["name"]
         line_range = selected_line["range"]
 
-        delay_info = await get_delay_info(line_pos, line_name, line_range)
+        delay_info = await get_delay_info(self.session, line_pos, line_name, line_range)
         await interaction.followup.send(delay_info)
 
 
 class LineSelectView(discord.ui.View):
-    def __init__(self, lines):
+    def __init__(self, lines, session: aiohttp.ClientSession):
         super().__init__()
         line_items = list(lines.items())
         for i in range(0, len(line_items), 25):
             chunk = dict(line_items[i : i + 25])
             if not chunk:
                 break
-            self.add_item(LineSelect(chunk))
-
-
-# グローバルに路線データをキャッシュ
-_cached_lines = None
-
-
-async def get_lines_data():
-    """路線データを取得・キャッシュする"""
-    global _cached_lines
-    if _cached_lines is None:
-        url = "https://www.train-guide.westjr.co.jp/api/v3/area_kinki_master.json"
-        res = requests.get(url)
-        res.raise_for_status()
-        linedata = res.json()
-        _cached_lines = linedata["lines"]
-    return _cached_lines
-
-
-def split_lines_into_groups(lines: dict) -> tuple[dict, dict]:
-    """路線を2つのグループに分割する"""
-    line_items = list(lines.items())
-    group1 = dict(line_items[:25])
-    group2 = dict(line_items[25:])
-    return group1, group2
+            self.add_item(LineSelect(chunk, session))
 
 
 class JRWest(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.session = None
+
+    async def cog_load(self):
+        """Cogが読み込まれた際に共有セッションを取得し、路線一覧・駅一覧の更新を開始"""
+        self.session = await self.bot.shared_session.acquire()
+        self.master_refresh_task.start()
+
+    async def cog_unload(self):
+        """Cogがアンロードされた際に更新タスクを停止し、共有セッションを解放"""
+        self.master_refresh_task.cancel()
+        await self.bot.shared_session.release()
+
+    @tasks.loop(minutes=30)
+    async def master_refresh_task(self):
+        """全エリアの路線一覧と全路線の駅一覧を事前に読み込み、期限切れのものを更新"""
+        try:
+            catalog = await area_masters.refresh_if_stale(self.session)
+            await station_masters.refresh_all(
+                self.session, [line["pos"] for line in catalog.lines.values()]
+            )
+        except Exception as e:
+            logger.error(f"路線一覧・駅一覧の更新でエラーが発生しました: {e}")
 
     @discord.app_commands.command(name="jr_west_delay", description="JR西日本の遅延情報を取得します。")
     @discord.app_commands.describe(
-        group="路線グループを選択してください", line="路線を選択してください"
+        group="エリア（路線グループ）を選択してください", line="路線を選択してください"
     )
     async def jr_west_delay(
         self, interaction: discord.Interaction, group: str, line: Optional[str] = None
     ):
         try:
-            lines = await get_lines_data()
-            group1, group2 = split_lines_into_groups(lines)
-
-            if group == "group1":
-                selected_lines = group1
-            elif group == "group2":
-                selected_lines = group2
-            else:
+            catalog = await area_masters.ensure_loaded(self.session)
+            selected_lines = catalog.group_lines(group)
+
+            if selected_lines is None:
                 await interaction.response.send_message("無効なグループが選択されました。")
                 return
 
@@ -168,20 +224,52 @@ class JRWest(commands.Cog):
             line_name = selected_line["name"]
             line_range = selected_line["range"]
 
-            delay_info = await get_delay_info(line_pos, line_name, line_range)
+            delay_info = await get_delay_info(self.session, line_pos, line_name, line_range)
             await interaction.response.send_message(delay_info)
 
-        except (RequestException, json.JSONDecodeError) as e:
+        except (ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
             await interaction.response.send_message(f"遅延情報の取得に失敗しました: {e}")
 
+    @discord.app_commands.command(name="jr_west_delay_summary", description="JR西日本のエリア内全路線の遅延をまとめて表示します。")
+    @discord.app_commands.describe(area="エリアを選択してください")
+    async def jr_west_delay_summary(self, interaction: discord.Interaction, area: str):
+        # 路線一覧が未取得だと全エリア分の取得で3秒を超えることがあるため、先に応答しておく
+        await interaction.response.defer()
+        try:
+            catalog = await area_masters.ensure_loaded(self.session)
+        except (ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            await interaction.followup.send(f"路線一覧の取得に失敗しました: {e}")
+            return
+        line_keys = catalog.by_area.get(area)
+        if not line_keys:
+            await interaction.followup.send("無効なエリアが選択されました。")
+            return
+
+        lines = {key: catalog.lines[key] for key in line_keys}
+        results = await sweep_delays(self.session, lines)
+        pages = build_summary_pages(AREAS.get(area, area), results)
+        if len(pages) > 1:
+            await interaction.followup.send(embed=pages[0], view=SummaryPaginator(pages))
+        else:
+            await interaction.followup.send(embed=pages[0])
+
+    @jr_west_delay_summary.autocomplete("area")
+    async def area_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [
+            discord.app_commands.Choice(name=AREAS.get(area, area), value=area)
+            for area in area_masters.catalog.by_area
+            if current in AREAS.get(area, area)
+        ]
+
     # オートコンプリート関数
     @jr_west_delay.autocomplete("group")
     async def group_autocomplete(self, interaction: discord.Interaction, current: str):
         choices = [
-            discord.app_commands.Choice(name="路線グループ1 (1-25)", value="group1"),
-            discord.app_commands.Choice(name="路線グループ2 (26-)", value="group2"),
+            discord.app_commands.Choice(name=label, value=group_id)
+            for group_id, (label, _) in area_masters.catalog.groups.items()
+            if current in label
         ]
-        return choices
+        return choices[:25]
 
     @jr_west_delay.autocomplete("line")
     async def line_autocomplete(self, interaction: discord.Interaction, current: str):
@@ -190,14 +278,8 @@ class JRWest(commands.Cog):
             if not group:
                 return []
 
-            lines = await get_lines_data()
-            group1, group2 = split_lines_into_groups(lines)
-
-            if group == "group1":
-                selected_lines = group1
-            elif group == "group2":
-                selected_lines = group2
-            else:
+            selected_lines = area_masters.catalog.group_lines(group)
+            if selected_lines is None:
                 return []
 
             choices = []
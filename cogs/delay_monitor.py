@@ -4,13 +4,16 @@ import asyncio
 from logging import getLogger
 import sys
 import os
+import time
 from datetime import datetime
 
 # プロジェクトルートを sys.path に追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from API.TokyoMetro import get_train_status
-from env.config import Config
+from API.TokyoMetro import format_railway_name, format_subscription_target, resolve_railway
+from API.TokyoMetroAsync import get_live_train_status
+from utils.history import RESOLVED, STATUS_CHANGED, TOKYO_METRO
+from utils.poll_scheduler import AdaptivePollScheduler, parse_valid
 
 # ロガーの設定
 logger = getLogger(__name__)
@@ -18,30 +21,64 @@ logger = getLogger(__name__)
 class DelayMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.config = Config()
         self.previous_delays = {}  # 前回の遅延情報を保存
+        self.previous_version = None  # 前回確認した運行状況のバージョン
+        self.scheduler = AdaptivePollScheduler()  # 次の取得までの間隔を決める
+        self.session = None
         
     async def cog_load(self):
         """Cogが読み込まれた際に監視タスクを開始"""
+        self.session = await self.bot.shared_session.acquire()
+        await self.bot.subscriptions.load()
+        await self.bot.history.open()
+        # 再起動前に通知済みの遅延を引き継ぐ（同じ遅延を再通知しない）
+        for row in await self.bot.history.load_active(TOKYO_METRO):
+            operator = row["operator"]
+            if operator is None and row["line"].startswith("odpt.Railway:"):
+                # 運営会社を記録していない古い履歴は路線IDから求める
+                # （odpt.Railway:TokyoMetro.Ginza -> odpt.Operator:TokyoMetro）
+                operator = "odpt.Operator:" + row["line"].split(":", 1)[1].split(".", 1)[0]
+            self.previous_delays[row["line"]] = {
+                "status": row["status"],
+                "time_of_origin": row["time_of_origin"],
+                "railway": row["line"],
+                "operator": operator
+            }
         logger.info("遅延監視タスクを開始します")
         self.delay_monitor_task.start()
     
-    def cog_unload(self):
+    async def cog_unload(self):
         """Cogがアンロードされた際に監視タスクを停止"""
         logger.info("遅延監視タスクを停止します")
         self.delay_monitor_task.cancel()
+        await self.bot.history.flush()
+        await self.bot.shared_session.release()
     
     @tasks.loop(minutes=1)
     async def delay_monitor_task(self):
-        """1分ごとに遅延情報をチェック"""
+        """遅延情報をチェック（間隔は状況に応じて AdaptivePollScheduler が決める）"""
         try:
             logger.info("遅延情報をチェック中...")
-            status_info = get_train_status()
+            # 取得結果は運行状況ストアに登録され、delay_status などからも参照される
+            started = time.time()
+            snapshot = await get_live_train_status(self.session, force_refresh=True)
             
-            if not status_info:
+            # 取得に失敗すると前回の状況が返るため、今回取得したものでなければ失敗として扱う
+            if snapshot is None or not snapshot.data or snapshot.fetched_at < started:
                 logger.warning("遅延情報の取得に失敗しました")
+                self.scheduler.observe_failure()
                 return
             
+            # 提供元が示す次の更新予定時刻
+            valid_until = parse_valid(info.get("valid") for info in snapshot.data)
+            
+            # 前回から内容が変わっていなければ比較を省略
+            if snapshot.version == self.previous_version:
+                self.scheduler.observe(False, bool(self.previous_delays), valid_until)
+                return
+            self.previous_version = snapshot.version
+            status_info = snapshot.data
+            
             # 遅延がある路線を抽出
             current_delays = {}
             for info in status_info:
@@ -53,7 +90,8 @@ class DelayMonitor(commands.Cog):
                     current_delays[railway] = {
                         "status": status,
                         "time_of_origin": info.get("time_of_origin"),
-                        "railway": railway
+                        "railway": railway,
+                        "operator": info.get("operator")
                     }
             
             # 新しい遅延があるかチェック
@@ -70,90 +108,89 @@ class DelayMonitor(commands.Cog):
                 if railway not in current_delays:
                     resolved_delays[railway] = self.previous_delays[railway]
             
+            # 状態の変化を履歴に記録
+            for railway, delay_info in new_delays.items():
+                self.bot.history.record(
+                    TOKYO_METRO, railway, STATUS_CHANGED,
+                    status=delay_info["status"], time_of_origin=delay_info.get("time_of_origin"),
+                    operator=delay_info.get("operator")
+                )
+            for railway in resolved_delays:
+                self.bot.history.record(TOKYO_METRO, railway, RESOLVED)
+            
             # 遅延情報を各サーバーに送信
             if new_delays or resolved_delays:
                 await self.send_delay_notifications(new_delays, resolved_delays)
             
             # 前回の遅延情報を更新
             self.previous_delays = current_delays
+            self.scheduler.observe(
+                bool(new_delays or resolved_delays), bool(current_delays), valid_until
+            )
             
         except Exception as e:
             logger.error(f"遅延監視タスクでエラーが発生しました: {e}")
+            self.scheduler.observe_failure()
+        finally:
+            interval = self.scheduler.next_interval()
+            self.delay_monitor_task.change_interval(seconds=interval)
+            logger.debug(f"次の遅延情報チェックは{interval:.0f}秒後です")
     
     async def send_delay_notifications(self, new_delays: dict, resolved_delays: dict):
         """遅延情報を各サーバーに送信"""
-        delay_channels = self.config.get_all_delay_channels()
+        subscriptions = self.bot.subscriptions
+        deliveries: dict[int, list[discord.Embed]] = {}
         
-        for guild_id, channel_id in delay_channels.items():
-            try:
-                channel = self.bot.get_channel(channel_id)
-                if not channel:
-                    logger.warning(f"チャンネルが見つかりません: {channel_id} (サーバー: {guild_id})")
-                    continue
-                
-                embeds = []
-                
-                # 新しい遅延情報
-                for railway, delay_info in new_delays.items():
-                    embed = discord.Embed(
-                        title="🚨 遅延情報",
-                        description=f"**{self.format_railway_name(railway)}**",
-                        color=discord.Color.red(),
-                        timestamp=datetime.now()
-                    )
-                    embed.add_field(
-                        name="運行状況",
-                        value=delay_info["status"],
-                        inline=False
-                    )
-                    if delay_info.get("time_of_origin"):
-                        embed.add_field(
-                            name="発生時刻",
-                            value=delay_info["time_of_origin"],
-                            inline=True
-                        )
-                    embeds.append(embed)
-                
-                # 解消された遅延情報
-                for railway, delay_info in resolved_delays.items():
-                    embed = discord.Embed(
-                        title="✅ 運行正常化",
-                        description=f"**{self.format_railway_name(railway)}**",
-                        color=discord.Color.green(),
-                        timestamp=datetime.now()
-                    )
-                    embed.add_field(
-                        name="状況",
-                        value="運行が正常化されました",
-                        inline=False
-                    )
-                    embeds.append(embed)
-                
-                # Embedを送信
-                for embed in embeds:
-                    await channel.send(embed=embed)
-                    
-            except Exception as e:
-                logger.error(f"チャンネル {channel_id} への送信でエラーが発生しました: {e}")
+        def add_delivery(delay_info: dict, embed: discord.Embed):
+            # その路線・事業者を購読しているチャンネルだけに送る
+            for channel_id in subscriptions.delay_channels_for(
+                delay_info["railway"], delay_info.get("operator")
+            ):
+                deliveries.setdefault(channel_id, []).append(embed)
+        
+        # 新しい遅延情報
+        for railway, delay_info in new_delays.items():
+            embed = discord.Embed(
+                title="🚨 遅延情報",
+                description=f"**{self.format_railway_name(railway)}**",
+                color=discord.Color.red(),
+                timestamp=datetime.now()
+            )
+            embed.add_field(
+                name="運行状況",
+                value=delay_info["status"],
+                inline=False
+            )
+            if delay_info.get("time_of_origin"):
+                embed.add_field(
+                    name="発生時刻",
+                    value=delay_info["time_of_origin"],
+                    inline=True
+                )
+            add_delivery(delay_info, embed)
+        
+        # 解消された遅延情報
+        for railway, delay_info in resolved_delays.items():
+            embed = discord.Embed(
+                title="✅ 運行正常化",
+                description=f"**{self.format_railway_name(railway)}**",
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            embed.add_field(
+                name="状況",
+                value="運行が正常化されました",
+                inline=False
+            )
+            add_delivery(delay_info, embed)
+        
+        # 対象のチャンネルにまとめて送信（1メッセージ最大10件のEmbed）
+        if deliveries:
+            await self.bot.notifier.dispatch(deliveries)
     
     def format_railway_name(self, railway: str) -> str:
         """路線名をフォーマット"""
-        # odpt:Railway:TokyoMetro.Ginza -> 銀座線
-        if "TokyoMetro." in railway:
-            line_name = railway.split("TokyoMetro.")[-1]
-            line_mapping = {
-                "Ginza": "銀座線",
-                "Marunouchi": "丸ノ内線",
-                "Hibiya": "日比谷線",
-                "Tozai": "東西線",
-                "Chiyoda": "千代田線",
-                "Yurakucho": "有楽町線",
-                "Hanzomon": "半蔵門線",
-                "Namboku": "南北線",
-                "Fukutoshin": "副都心線"
-            }
-            return line_mapping.get(line_name, line_name + "線")
-        return railway
+        return format_railway_name(railway)
     
     @delay_monitor_task.before_loop
     async def before_delay_monitor(self):
@@ -169,24 +206,7 @@ class DelayMonitor(commands.Cog):
             channel = ctx.channel
         
         try:
-            # config.iniファイルを更新
-            config_path = os.path.join(os.path.dirname(__file__), '..', 'env', 'config.ini')
-            
-            # 現在の設定を読み込み
-            import configparser
-            config = configparser.ConfigParser()
-            config.read(config_path, 'UTF-8')
-            
-            # MONITORINGセクションが存在しない場合は作成
-            if 'MONITORING' not in config:
-                config.add_section('MONITORING')
-            
-            # サーバーIDとチャンネルIDを設定
-            config['MONITORING'][str(ctx.guild.id)] = str(channel.id)
-            
-            # ファイルに書き込み
-            with open(config_path, 'w', encoding='UTF-8') as configfile:
-                config.write(configfile)
+            await self.bot.subscriptions.set_delay_channel(ctx.guild.id, channel.id)
             
             embed = discord.Embed(
                 title="✅ 設定完了",
@@ -195,9 +215,6 @@ class DelayMonitor(commands.Cog):
             )
             await ctx.send(embed=embed)
             
-            # 設定を再読み込み
-            self.config = Config()
-            
         except Exception as e:
             logger.error(f"チャンネル設定でエラーが発生しました: {e}")
             embed = discord.Embed(
@@ -207,13 +224,87 @@ class DelayMonitor(commands.Cog):
             )
             await ctx.send(embed=embed)
     
+    @commands.command(name="subscribe_railway")
+    @commands.has_permissions(administrator=True)
+    async def subscribe_railway(self, ctx, *, railway: str):
+        """通知を受け取る路線・事業者を追加（未設定の場合は全路線を通知）"""
+        target = resolve_railway(railway)
+        if target is None:
+            embed = discord.Embed(
+                title="❌ エラー",
+                description=f"`{railway}`に該当する路線・事業者が見つかりませんでした",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        try:
+            await self.bot.subscriptions.add_railway_subscription(ctx.guild.id, target)
+            targets = self.bot.subscriptions.get_railway_subscriptions(ctx.guild.id)
+            embed = discord.Embed(
+                title="✅ 設定完了",
+                description=f"{format_subscription_target(target)} の運行情報を通知します",
+                color=discord.Color.green()
+            )
+            embed.add_field(
+                name="通知する路線",
+                value="\n".join(sorted(format_subscription_target(t) for t in targets)),
+                inline=False
+            )
+            await ctx.send(embed=embed)
+        except Exception as e:
+            logger.error(f"路線の購読設定でエラーが発生しました: {e}")
+            embed = discord.Embed(
+                title="❌ エラー",
+                description="設定の保存に失敗しました",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+    
+    @commands.command(name="unsubscribe_railway")
+    @commands.has_permissions(administrator=True)
+    async def unsubscribe_railway(self, ctx, *, railway: str):
+        """通知を受け取る路線・事業者を削除（すべて削除すると全路線を通知）"""
+        target = resolve_railway(railway)
+        if target is None or target not in self.bot.subscriptions.get_railway_subscriptions(ctx.guild.id):
+            embed = discord.Embed(
+                title="❌ エラー",
+                description=f"`{railway}`は通知する路線に含まれていません",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+        
+        try:
+            await self.bot.subscriptions.remove_railway_subscription(ctx.guild.id, target)
+            targets = self.bot.subscriptions.get_railway_subscriptions(ctx.guild.id)
+            embed = discord.Embed(
+                title="✅ 設定完了",
+                description=f"{format_subscription_target(target)} の通知を停止しました",
+                color=discord.Color.green()
+            )
+            embed.add_field(
+                name="通知する路線",
+                value="\n".join(sorted(format_subscription_target(t) for t in targets)) or "全路線",
+                inline=False
+            )
+            await ctx.send(embed=embed)
+        except Exception as e:
+            logger.error(f"路線の購読設定でエラーが発生しました: {e}")
+            embed = discord.Embed(
+                title="❌ エラー",
+                description="設定の保存に失敗しました",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+    
     @commands.command(name="delay_status")
-    async def delay_status(self, ctx):
-        """現在の遅延情報を表示"""
+    async def delay_status(self, ctx, refresh: bool = False):
+        """現在の遅延情報を表示（refresh を指定すると最新の情報を取得）"""
         try:
-            status_info = get_train_status()
+            snapshot = await get_live_train_status(self.session, force_refresh=refresh)
             
-            if not status_info:
+            if snapshot is None or not snapshot.data:
                 embed = discord.Embed(
                     title="❌ エラー",
                     description="遅延情報の取得に失敗しました",
@@ -222,6 +313,8 @@ class DelayMonitor(commands.Cog):
                 await ctx.send(embed=embed)
                 return
             
+            status_info = snapshot.data
+            fetched_at = datetime.fromtimestamp(snapshot.fetched_at)
             delays = []
             normal_operations = []
             
@@ -241,7 +334,7 @@ class DelayMonitor(commands.Cog):
                 embed = discord.Embed(
                     title="🚨 現在の遅延情報",
                     color=discord.Color.red(),
-                    timestamp=datetime.now()
+                    timestamp=fetched_at
                 )
                 for delay in delays:
                     embed.add_field(
@@ -254,7 +347,7 @@ class DelayMonitor(commands.Cog):
                     title="✅ 運行状況",
                     description="現在、遅延は発生していません",
                     color=discord.Color.green(),
-                    timestamp=datetime.now()
+                    timestamp=fetched_at
                 )
             
             await ctx.send(embed=embed)
@@ -0,0 +1,165 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+from logging import getLogger
+import sys
+import os
+from typing import Optional
+
+import numpy as np
+
+# プロジェクトルートを sys.path に追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from API.JRWest import area_masters
+from API.TokyoMetro import RAILWAY_NAMES, format_railway_name, resolve_railway
+from utils.delay_stats import DelayStats, format_slot
+from utils.history import JR_WEST, TOKYO_METRO
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 1つの集計で表示する件数
+MAX_ROWS = 10
+
+SOURCES = [
+    app_commands.Choice(name="東京メトロ", value=TOKYO_METRO),
+    app_commands.Choice(name="JR西日本", value=JR_WEST),
+]
+
+
+def jr_west_line_name(line_key: str) -> str:
+    line = area_masters.catalog.lines.get(line_key)
+    return f"{line['name']}({line['range']})" if line else line_key
+
+
+class DelayStatsCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.stats = DelayStats(bot.history)
+
+    async def cog_load(self):
+        await self.bot.history.open()
+
+    def build_metro_embed(self, result: dict, days: int, railway: Optional[str]) -> discord.Embed:
+        """東京メトロの運行情報の発生時間の集計をEmbedにする"""
+        embed = discord.Embed(
+            title=f"📊 東京メトロ 運行情報の発生時間（過去{days}日）",
+            color=discord.Color.blue()
+        )
+        lines = result["lines"]
+        table = result["table"]
+        if railway is not None:
+            if railway not in lines:
+                embed.description = f"{format_railway_name(railway)} の記録はありません"
+                return embed
+            row = table[lines.index(railway)]
+            embed.description = (
+                f"**{format_railway_name(railway)}** 合計 {row.sum():.0f}分 / "
+                f"{result['incidents'][lines.index(railway)]}件"
+            )
+            slots = np.argsort(-row, kind="stable")[:MAX_ROWS]
+            value = "\n".join(f"{format_slot(slot)}: {row[slot]:.0f}分" for slot in slots if row[slot] > 0)
+            embed.add_field(name="曜日×時台の上位", value=value or "なし", inline=False)
+            return embed
+
+        if not lines or not result["totals"].any():
+            embed.description = "期間内の記録はありません"
+            return embed
+        order = np.argsort(-result["totals"], kind="stable")[:MAX_ROWS]
+        embed.add_field(
+            name="路線ごとの合計（最も多い時間帯）",
+            value="\n".join(
+                f"{format_railway_name(lines[i])}: {result['totals'][i]:.0f}分 / "
+                f"{result['incidents'][i]}件（{format_slot(int(table[i].argmax()))}）"
+                for i in order if result["totals"][i] > 0
+            ),
+            inline=False
+        )
+        # 曜日×時台ごとに最も長かった路線
+        worst_line = table.argmax(axis=0)
+        worst_minutes = table.max(axis=0)
+        slots = np.argsort(-worst_minutes, kind="stable")[:MAX_ROWS]
+        embed.add_field(
+            name="曜日×時台ごとの最多路線",
+            value="\n".join(
+                f"{format_slot(slot)}: {format_railway_name(lines[worst_line[slot]])} {worst_minutes[slot]:.0f}分"
+                for slot in slots if worst_minutes[slot] > 0
+            ),
+            inline=False
+        )
+        return embed
+
+    def build_jr_west_embed(self, result: dict, days: int, line_key: Optional[str]) -> discord.Embed:
+        """JR西日本の平均遅延の集計をEmbedにする"""
+        target = f" {jr_west_line_name(line_key)} 駅別" if line_key else " 路線別"
+        embed = discord.Embed(
+            title=f"📊 JR西日本{target} 平均遅延（過去{days}日）",
+            color=discord.Color.blue()
+        )
+        if not result["keys"]:
+            embed.description = "期間内の記録はありません"
+            return embed
+        rows = []
+        for key, mean, maximum, count in list(
+            zip(result["keys"], result["mean"], result["max"], result["count"])
+        )[:MAX_ROWS]:
+            name = key if line_key else jr_west_line_name(key)
+            rows.append(f"{name}: 平均 {mean:.1f}分 / 最大 {maximum:.0f}分（{count}本）")
+        embed.description = "\n".join(rows)
+        return embed
+
+    @app_commands.command(name="delay_stats", description="記録した遅延履歴を集計します。")
+    @app_commands.describe(
+        source="集計する事業者",
+        days="集計する期間（日）",
+        line="路線（東京メトロは曜日×時台、JR西日本は駅ごとに集計）"
+    )
+    @app_commands.choices(source=SOURCES)
+    async def delay_stats(
+        self,
+        interaction: discord.Interaction,
+        source: app_commands.Choice[str],
+        days: app_commands.Range[int, 1, 365] = 30,
+        line: Optional[str] = None,
+    ):
+        """遅延履歴を集計して表示します。"""
+        await interaction.response.defer()
+        try:
+            if source.value == TOKYO_METRO:
+                railway = resolve_railway(line) if line else None
+                if line and (railway is None or not railway.startswith("odpt.Railway:")):
+                    await interaction.followup.send(f"`{line}`に該当する路線が見つかりませんでした。")
+                    return
+                result = await self.stats.metro_disruption(days)
+                embed = self.build_metro_embed(result, days, railway)
+            else:
+                if line and line not in area_masters.catalog.lines:
+                    await interaction.followup.send(f"`{line}`に該当する路線が見つかりませんでした。候補から選択してください。")
+                    return
+                result = await self.stats.jr_west_delay(days, line)
+                embed = self.build_jr_west_embed(result, days, line)
+            await interaction.followup.send(embed=embed)
+        except Exception as e:
+            logger.error(f"遅延履歴の集計でエラーが発生しました: {e}")
+            await interaction.followup.send("遅延履歴の集計に失敗しました。")
+
+    @delay_stats.autocomplete("line")
+    async def line_autocomplete(self, interaction: discord.Interaction, current: str):
+        source = interaction.namespace.source
+        if source == JR_WEST:
+            choices = [
+                app_commands.Choice(name=jr_west_line_name(line_key)[:100], value=line_key)
+                for line_key in area_masters.catalog.lines
+                if current in jr_west_line_name(line_key)
+            ]
+        else:
+            choices = [
+                app_commands.Choice(name=label, value=line_name)
+                for line_name, label in RAILWAY_NAMES.items()
+                if current in label or current.lower() in line_name.lower()
+            ]
+        return choices[:25]
+
+async def setup(bot):
+    await bot.add_cog(DelayStatsCog(bot))
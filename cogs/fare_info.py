@@ -1,40 +1,131 @@
+import asyncio
 import discord
 from discord import app_commands
-from discord.ext import commands
-from API.TokyoMetro import get_fare_information, get_station_information
+from discord.ext import commands, tasks
+from API.TokyoMetro import format_railway_name
+from API.TokyoMetroAsync import get_fare_information, get_station_information
+from API.cache import dataset_version
+from API.fare import FareGraph, FareIndex
+from API.snapshot import load_snapshot, save_snapshot
+from API.station_index import StationIndex
 import logging
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
+# オートコンプリートで返す候補の最大数（Discord の制限）
+MAX_AUTOCOMPLETE_CHOICES = 25
+
+# スナップショット名
+STATION_SNAPSHOT = "tokyometro_station"
+FARE_SNAPSHOT = "tokyometro_railway_fare"
+
 class FareInfo(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.stations = []
         self.station_names = []
-        self._load_stations()
+        self.station_index = None
+        self.fares = []
+        self.station_version = None
+        self.fare_version = None
+        self.fare_index = None
+        self.fare_graph = None
+        self.session = None
+
+    async def cog_load(self):
+        """Cogが読み込まれた際にスナップショットから復元し、バックグラウンドで更新"""
+        self.session = await self.bot.shared_session.acquire()
+        self._load_snapshots()
+        self.dataset_refresh_task.start()
+
+    async def cog_unload(self):
+        """Cogがアンロードされた際に更新タスクを停止し、共有セッションを解放"""
+        self.dataset_refresh_task.cancel()
+        await self.bot.shared_session.release()
+
+    def _load_snapshots(self):
+        """ディスク上のスナップショットから駅・運賃データを読み込む"""
+        station_snapshot = load_snapshot(STATION_SNAPSHOT)
+        if station_snapshot:
+            self.station_version, stations = station_snapshot
+            self._apply_stations(stations)
+            logger.info(f"駅情報をスナップショットから読み込みました (version={self.station_version})")
+        fare_snapshot = load_snapshot(FARE_SNAPSHOT)
+        if fare_snapshot:
+            version, fares = fare_snapshot
+            self._apply_fares(fares, version)
+            logger.info(f"運賃情報をスナップショットから読み込みました: {len(self.fares)}件 (version={self.fare_version})")
 
-    def _load_stations(self):
+    @tasks.loop(hours=6)
+    async def dataset_refresh_task(self):
+        """駅・運賃データを上流から取得し、更新があればスナップショットを書き換える"""
+        await self._load_stations()
+        await self._load_fares()
+
+    async def _load_stations(self):
         """駅情報を取得し、駅名のリストを作成"""
         try:
-            station_info = get_station_information()
+            station_info = await get_station_information(self.session)
             if station_info:
-                self.stations = station_info
-                # 駅名を抽出（日本語名を優先）
-                for station in station_info:
-                    if station.get("station_title") and station.get("station_title").get("ja"):
-                        self.station_names.append(station["station_title"]["ja"])
-                    elif station.get("title"):
-                        self.station_names.append(station["title"])
-                
-                # 重複を除去し、ソート
-                self.station_names = sorted(list(set(self.station_names)))
-                logger.info(f"読み込んだ駅数: {len(self.station_names)}")
+                version = dataset_version(station_info, ("date", "issued"))
+                if version is None or version != self.station_version:
+                    await asyncio.to_thread(save_snapshot, STATION_SNAPSHOT, version, station_info)
+                    self.station_version = version
+                self._apply_stations(station_info)
             else:
                 logger.error("駅情報を取得できませんでした")
         except Exception as e:
             logger.error(f"駅情報読み込み中にエラーが発生しました: {e}")
 
+    async def _load_fares(self):
+        """運賃情報を取得し、更新があればスナップショットを保存"""
+        try:
+            fare_info = await get_fare_information(self.session)
+            if fare_info:
+                version = dataset_version(fare_info, ("date", "issued"))
+                if version is None or version != self.fare_version:
+                    await asyncio.to_thread(save_snapshot, FARE_SNAPSHOT, version, fare_info)
+                self._apply_fares(fare_info, version)
+            else:
+                logger.error("運賃情報を取得できませんでした")
+        except Exception as e:
+            logger.error(f"運賃情報読み込み中にエラーが発生しました: {e}")
+
+    def _apply_fares(self, fares: list, version: str | None):
+        """運賃情報を反映し、バージョンが変わった場合のみ索引を作り直す"""
+        self.fares = fares
+        if self.fare_index is None or version is None or version != self.fare_version:
+            self.fare_index = FareIndex(fares, version)
+            logger.info(f"運賃索引を構築しました: {len(self.fare_index)}区間 (version={version})")
+        self.fare_version = version
+
+    def _get_fare_graph(self) -> FareGraph | None:
+        """現在の駅・運賃データのバージョンに対応する運賃グラフを返す"""
+        if not self.fares:
+            return None
+        version = (self.station_version, self.fare_version)
+        if self.fare_graph is None or self.fare_graph.version != version or None in version:
+            self.fare_graph = FareGraph(self.stations, self.fares, version)
+            logger.info(f"運賃グラフを構築しました: {len(self.fare_graph)}駅 (version={version})")
+        return self.fare_graph
+
+    def _apply_stations(self, station_info: list):
+        """駅情報を反映し、駅名のリストを作成"""
+        self.stations = station_info
+        self.station_index = StationIndex(station_info)
+        station_names = []
+        # 駅名を抽出（日本語名を優先）
+        for station in station_info:
+            if station.get("station_title") and station.get("station_title").get("ja"):
+                station_names.append(station["station_title"]["ja"])
+            elif station.get("title"):
+                station_names.append(station["title"])
+        
+        # 重複を除去し、ソート
+        self.station_names = sorted(list(set(station_names)))
+        logger.info(f"読み込んだ駅数: {len(self.station_names)}")
+
     def get_station_id_from_name(self, station_name: str) -> str:
         """駅名から駅IDを取得（運賃API用のIDに変換）"""
         for station in self.stations:
@@ -68,55 +159,18 @@ class FareInfo(commands.Cog):
         return station_ids
 
     def find_stations_by_name(self, input_name: str) -> list:
-        """入力された駅名から候補駅を検索（部分一致・曖昧検索対応）"""
-        matches = []
-        input_lower = input_name.lower().replace(" ", "").replace("　", "")
-        
-        for station in self.stations:
-            station_name = ""
-            if station.get("station_title") and station.get("station_title").get("ja"):
-                station_name = station.get("station_title").get("ja")
-            elif station.get("title"):
-                station_name = station.get("title")
-            
-            if station_name:
-                station_lower = station_name.lower().replace(" ", "").replace("　", "")
-                same_as = station.get("same_as")
-                railway = station.get("railway", "")
-                
-                # 路線の優先順位を設定（銀座線、丸ノ内線など主要路線を優先）
-                railway_priority = 1
-                if "Ginza" in railway:
-                    railway_priority = 0
-                elif "Marunouchi" in railway:
-                    railway_priority = 0
-                elif "Hibiya" in railway:
-                    railway_priority = 0
-                
-                # 完全一致
-                if station_lower == input_lower:
-                    matches.append({
-                        "name": station_name,
-                        "id": same_as,
-                        "priority": (1, railway_priority),
-                        "railway": railway
-                    })
-                # 前方一致
-                elif station_lower.startswith(input_lower):
-                    matches.append({
-                        "name": station_name,
-                        "id": same_as,
-                        "priority": (2, railway_priority),
-                        "railway": railway
-                    })
-                # 部分一致
-                elif input_lower in station_lower:
-                    matches.append({
-                        "name": station_name,
-                        "id": same_as,
-                        "priority": (3, railway_priority),
-                        "railway": railway
-                    })
+        """入力された駅名から候補駅を検索（部分一致・曖昧検索・読み仮名対応）"""
+        if self.station_index is None:
+            return []
+        matches = [
+            {
+                "name": entry.name,
+                "id": entry.id,
+                "priority": rank,
+                "railway": entry.railway,
+            }
+            for rank, entry in self.station_index.search(input_name)
+        ]
         
         # 優先度でソートし、重複を除去
         seen_names = {}
@@ -138,16 +192,57 @@ class FareInfo(commands.Cog):
         
         return result[:10]  # 最大10件まで返す
 
+    def resolve_station(self, value: str) -> list:
+        """オートコンプリートで選ばれた駅IDなら直接解決し、それ以外は駅名で検索"""
+        entry = self.station_index.get(value) if self.station_index else None
+        if entry is None:
+            return self.find_stations_by_name(value)
+        # 選ばれた駅を先頭に、同じ駅名の他路線の駅も候補に含める
+        entries = [entry] + [e for e in self.station_index.same_name(entry.name) if e is not entry]
+        return [
+            {
+                "name": e.name,
+                "id": e.id,
+                "priority": (0, e.railway_priority),
+                "railway": e.railway,
+            }
+            for e in entries
+        ]
+
+    def station_display_name(self, value: str) -> str:
+        """駅IDが渡された場合は駅名に置き換える"""
+        entry = self.station_index.get(value) if self.station_index else None
+        return entry.name if entry else value
+
+    def station_choices(self, current: str) -> list[app_commands.Choice[str]]:
+        """入力中の文字列から駅の候補を作成（値は駅ID）"""
+        if self.station_index is None:
+            return []
+        if current:
+            entries = [entry for _, entry in self.station_index.search(current, MAX_AUTOCOMPLETE_CHOICES)]
+        else:
+            entries = self.station_index.entries[:MAX_AUTOCOMPLETE_CHOICES]
+        return [
+            app_commands.Choice(
+                name=f"{entry.name}({format_railway_name(entry.railway)})", value=entry.id
+            )
+            for entry in entries
+            if entry.id
+        ]
+
     @app_commands.command(name="fare", description="東京メトロの駅間の運賃を検索します。")
-    @app_commands.describe(from_station="出発駅（駅名を入力してください）", to_station="到着駅（駅名を入力してください）")
+    @app_commands.describe(from_station="出発駅（駅名を入力し、候補から選択してください）", to_station="到着駅（駅名を入力し、候補から選択してください）")
     async def fare(self, interaction: discord.Interaction, from_station: str, to_station: str):
         """指定された2駅間の運賃情報を表示します。"""
+        from_station_id, to_station_id = from_station, to_station
+        from_station = self.station_display_name(from_station_id)
+        to_station = self.station_display_name(to_station_id)
         await interaction.response.send_message(f"`{from_station}`駅から`{to_station}`駅までの運賃を検索しています...", ephemeral=True)
         
         try:
-            # 入力された駅名から候補を検索
-            from_candidates = self.find_stations_by_name(from_station)
-            to_candidates = self.find_stations_by_name(to_station)
+            # 入力された駅名から候補を検索（オートコンプリートの駅IDはそのまま使用）
+            from_candidates = self.resolve_station(from_station_id)
+            to_candidates = self.resolve_station(to_station_id)
             
             if not from_candidates:
                 embed = discord.Embed(
@@ -213,8 +308,12 @@ class FareInfo(commands.Cog):
                         other_to.append(c['name'])
                 to_info += f"\n（他の候補: {', '.join(other_to)}{'...' if len(to_candidates) > 6 else ''}）"
 
-            # 運賃情報を取得
-            all_fares = get_fare_information()
+            # 運賃情報を取得（通常はメモリ上のデータを使用）
+            if not self.fares:
+                fare_info = await get_fare_information(self.session)
+                if fare_info:
+                    self._apply_fares(fare_info, dataset_version(fare_info, ("date", "issued")))
+            all_fares = self.fares
             if not all_fares:
                 logger.error("運賃情報がNoneまたは空です")
                 await interaction.followup.send("運賃情報を取得できませんでした。")
@@ -237,19 +336,8 @@ class FareInfo(commands.Cog):
                 if candidate.get('id') and candidate['id'] not in to_station_ids:
                     to_station_ids.append(candidate['id'])
 
-            # 全ての組み合わせで運賃情報を検索
-            found_fare = None
-            for from_id in from_station_ids:
-                for to_id in to_station_ids:
-                    for fare in all_fares:
-                        if ((fare["from_station"] == from_id and fare["to_station"] == to_id) or
-                            (fare["from_station"] == to_id and fare["to_station"] == from_id)):
-                            found_fare = fare
-                            break
-                    if found_fare:
-                        break
-                if found_fare:
-                    break
+            # 全ての組み合わせで運賃情報を検索（駅ペアの索引を直接参照）
+            found_fare = self.fare_index.find(from_station_ids, to_station_ids)
             
             if found_fare:
                 embed = discord.Embed(
@@ -283,93 +371,14 @@ class FareInfo(commands.Cog):
                     await interaction.followup.send("駅情報の取得に失敗したため、経路計算ができません。")
                     return
                 
-                from heapq import heappush, heappop
-                # 駅IDから駅名へのマップ作成
-                name_map = {}
-                for station in self.stations:
-                    # same_asキーから駅IDを取得
-                    sid = station.get("same_as") or station.get("id")
-                    name = station.get("station_title", {}).get("ja") or station.get("title")
-                    if sid and name:
-                        name_map[sid] = name
-                    
-                    # 乗換駅の情報も追加
-                    connecting_stations = station.get("connecting_station", [])
-                    if connecting_stations:  # None チェック
-                        for connected_station in connecting_stations:
-                            if (connected_station and 
-                                connected_station.startswith("odpt.Station:TokyoMetro") and 
-                                connected_station not in name_map):
-                                # 乗換先の駅名を推定（同じ駅名を使用）
-                                name_map[connected_station] = name
-                # グラフ構築: {駅ID: [(隣駅ID, costs), ...]}
-                graph = {}
-                if not all_fares:
+                # 運賃グラフを取得（データセットのバージョンごとに1回だけ構築）
+                graph = self._get_fare_graph()
+                if not graph:
                     logger.error("運賃データが空です")
                     await interaction.followup.send("運賃データが取得できないため、経路計算ができません。")
                     return
                 
-                for fare in all_fares:
-                    if not fare:
-                        continue
-                    u = fare.get("from_station")
-                    v = fare.get("to_station")
-                    if not u or not v:
-                        continue
-                    costs = {
-                        "ic": fare.get("ic_card_fare", 0),
-                        "ticket": fare.get("ticket_fare", 0),
-                        "child_ic": fare.get("child_ic_card_fare", 0),
-                        "child_ticket": fare.get("child_ticket_fare", 0),
-                    }
-                    graph.setdefault(u, []).append((v, costs))
-                    graph.setdefault(v, []).append((u, costs))
-                
-                # 乗換駅情報を追加（乗換接続を0円で追加）
-                added_connections = set()  # 重複を避けるためのセット
-                if self.stations:
-                    for station in self.stations:
-                        if not station:
-                            continue
-                        station_id = station.get("same_as")
-                        connecting_stations = station.get("connecting_station", [])
-                        
-                        if station_id and connecting_stations:
-                            # 東京メトロ内の他路線との接続
-                            metro_connections = [cs for cs in connecting_stations 
-                                               if cs and cs.startswith("odpt.Station:TokyoMetro")]
-                            
-                            for connected_station in metro_connections:
-                                if not connected_station:
-                                    continue
-                                # 重複チェック
-                                connection_key = tuple(sorted([station_id, connected_station]))
-                                if connection_key not in added_connections:
-                                    # 乗換は0円でグラフに追加
-                                    zero_costs = {"ic": 0, "ticket": 0, "child_ic": 0, "child_ticket": 0}
-                                    graph.setdefault(station_id, []).append((connected_station, zero_costs))
-                                    graph.setdefault(connected_station, []).append((station_id, zero_costs))
-                                    added_connections.add(connection_key)
-                # ダイクストラ: cost_keyの運賃で経路とコストを取得
-                def dijkstra(src, dst, cost_key):
-                    if not src or not dst or not graph:
-                        return None, None
-                    heap = [(0, src, [src])]
-                    visited = set()
-                    while heap:
-                        cost, node, path = heappop(heap)
-                        if node == dst:
-                            return cost, path
-                        if node in visited:
-                            continue
-                        visited.add(node)
-                        for nb, c in graph.get(node, []):
-                            if nb not in visited and c and cost_key in c:
-                                heappush(heap, (cost + c[cost_key], nb, path + [nb]))
-                    return None, None
-                
                 # 最良経路探索(ICカード運賃基準)
-                best = None  # (ic_cost, path)
                 logger.info(f"経路探索を開始: {len(from_station_ids)}個の出発駅から{len(to_station_ids)}個の到着駅へ")
                 
                 if not from_station_ids or not to_station_ids:
@@ -377,50 +386,18 @@ class FareInfo(commands.Cog):
                     await interaction.followup.send("駅IDの取得に失敗しました。駅名を確認してください。")
                     return
                 
-                for src in from_station_ids:
-                    if not src:
-                        continue
-                    for dst in to_station_ids:
-                        if not dst:
-                            continue
-                        ic_cost, path = dijkstra(src, dst, "ic")
-                        if ic_cost is None:
-                            continue
-                        if best is None or ic_cost < best[0]:
-                            best = (ic_cost, path)
+                # 全ての出発駅・到着駅候補を1回の探索で処理
+                totals, path = graph.find_route(from_station_ids, to_station_ids, "ic")
                             
-                logger.info(f"経路探索完了: {'経路が見つかりました' if best else '経路が見つかりませんでした'}")
-                # 経路が見つかった場合、他運賃も同経路で計算
-                if best:
-                    ic_cost, path = best
-                    if not path:
-                        logger.error("経路が空です")
-                        await interaction.followup.send("経路計算でエラーが発生しました。")
-                        return
-                    
-                    # 他運賃の合計
-                    ticket = child_ic = child_ticket = 0
-                    for i in range(len(path) - 1):
-                        u, v = path[i], path[i+1]
-                        if not u or not v:
-                            continue
-                        for nb, c in graph.get(u, []):
-                            if nb == v and c:
-                                ticket += c.get("ticket", 0)
-                                child_ic += c.get("child_ic", 0)
-                                child_ticket += c.get("child_ticket", 0)
-                                break
+                logger.info(f"経路探索完了: {'経路が見つかりました' if path else '経路が見つかりませんでした'}")
+                # 経路が見つかった場合、他運賃も同経路で計算済み
+                if path:
+                    ic_cost = totals["ic"]
+                    ticket = totals["ticket"]
+                    child_ic = totals["child_ic"]
+                    child_ticket = totals["child_ticket"]
                     # 経路の駅名リスト（重複駅名を統合）
-                    route_names = []
-                    prev_name = None
-                    for station_id in path:
-                        if not station_id:
-                            continue
-                        current_name = name_map.get(station_id, station_id)
-                        # 同じ駅名の連続する乗換駅は1つにまとめる
-                        if current_name != prev_name:
-                            route_names.append(current_name)
-                            prev_name = current_name
+                    route_names = graph.route_names(path)
                     
                     route_str = " → ".join(route_names)
                     embed = discord.Embed(
@@ -521,5 +498,13 @@ class FareInfo(commands.Cog):
             )
             await interaction.followup.send(embed=embed)
 
+    @fare.autocomplete("from_station")
+    async def from_station_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self.station_choices(current)
+
+    @fare.autocomplete("to_station")
+    async def to_station_autocomplete(self, interaction: discord.Interaction, current: str):
+        return self.station_choices(current)
+
 async def setup(bot):
     await bot.add_cog(FareInfo(bot))
@@ -0,0 +1,232 @@
+import discord
+from discord.ext import commands, tasks
+import asyncio
+from logging import getLogger
+import sys
+import os
+from datetime import datetime
+
+import aiohttp
+
+# プロジェクトルートを sys.path に追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from API.JRWest import (
+    DELAYED,
+    GONE,
+    RECOVERED,
+    WORSENED,
+    LineDelayState,
+    area_masters,
+    delay_level,
+    format_delayed_train,
+    get_live_trains,
+)
+from utils.history import JR_WEST
+from utils.poll_scheduler import AdaptivePollScheduler
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 同時に取得する路線数の上限
+POLL_CONCURRENCY = 8
+
+TRANSITION_LABELS = {
+    DELAYED: "🚨 遅延発生",
+    WORSENED: "⚠️ 遅延拡大",
+    RECOVERED: "✅ 回復",
+}
+
+
+class JRWestMonitor(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.line_states: dict[str, LineDelayState] = {}  # 路線キーごとの列車の遅延段階
+        self.scheduler = AdaptivePollScheduler()  # 次の取得までの間隔を決める
+        self.session = None
+
+    async def cog_load(self):
+        """Cogが読み込まれた際に監視タスクを開始"""
+        self.session = await self.bot.shared_session.acquire()
+        await self.bot.subscriptions.load()
+        await self.bot.history.open()
+        # 再起動前の列車ごとの遅延段階を引き継ぐ（同じ遅延を再通知しない）
+        for row in await self.bot.history.load_active(JR_WEST):
+            state = self.line_states.setdefault(row["line"], LineDelayState())
+            state.levels[row["train"]] = delay_level(row["delay_minutes"] or 0)
+        logger.info("JR西日本の遅延監視タスクを開始します")
+        self.jr_west_monitor_task.start()
+
+    async def cog_unload(self):
+        """Cogがアンロードされた際に監視タスクを停止"""
+        logger.info("JR西日本の遅延監視タスクを停止します")
+        self.jr_west_monitor_task.cancel()
+        await self.bot.history.flush()
+        await self.bot.shared_session.release()
+
+    @tasks.loop(minutes=1)
+    async def jr_west_monitor_task(self):
+        """監視対象の路線の列車位置を取得し、列車ごとの遅延の変化を通知
+
+        間隔は AdaptivePollScheduler が決める（遅延中は短く、平常時・深夜は長く）。
+        """
+        try:
+            # 路線キー -> 監視サーバー の転置索引（通知時に再構築しない）
+            line_guilds = self.bot.subscriptions.jr_west_line_guilds()
+
+            # 監視対象から外れた路線の状態は破棄する
+            for line_key in list(self.line_states):
+                if line_key not in line_guilds:
+                    del self.line_states[line_key]
+            if not line_guilds:
+                self.scheduler.observe(False, False)
+                return
+
+            catalog = await area_masters.ensure_loaded(self.session)
+            semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+
+            async def poll_line(line_key: str):
+                line = catalog.lines.get(line_key)
+                if line is None:
+                    logger.warning(f"監視対象の路線が見つかりません: {line_key}")
+                    return line_key, None, []
+                async with semaphore:
+                    try:
+                        # 取得結果は運行状況ストアに登録され、コマンドからも参照される
+                        snapshot = await get_live_trains(self.session, line["pos"], force_refresh=True)
+                    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+                        logger.warning(f"列車位置の取得に失敗しました: {line_key}: {e}")
+                        return line_key, line, []
+                state = self.line_states.setdefault(line_key, LineDelayState())
+                transitions = state.update(snapshot.data)
+                # 状態の変化を履歴に記録
+                for kind, train in transitions:
+                    self.bot.history.record(
+                        JR_WEST, line_key, kind,
+                        train=train["no"], delay_minutes=train["delay_minutes"], station=train["position"]
+                    )
+                # 消えた列車は履歴にだけ残し、通知しない
+                return line_key, line, [(kind, train) for kind, train in transitions if kind != GONE]
+
+            results = await asyncio.gather(*(poll_line(line_key) for line_key in list(line_guilds)))
+            deliveries: dict[int, list[discord.Embed]] = {}
+            for line_key, line, transitions in results:
+                if not transitions:
+                    continue
+                embed = self.build_transition_embed(line, transitions)
+                for guild_id in line_guilds.get(line_key, ()):
+                    channel_id = self.bot.subscriptions.get_delay_channel_id(guild_id)
+                    if channel_id is not None:
+                        deliveries.setdefault(channel_id, []).append(embed)
+            if deliveries:
+                # 全路線・全サーバー分をまとめて送信
+                await self.bot.notifier.dispatch(deliveries)
+
+            self.scheduler.observe(
+                any(transitions for _, _, transitions in results),
+                any(state.levels for state in self.line_states.values()),
+            )
+
+        except Exception as e:
+            logger.error(f"JR西日本の遅延監視タスクでエラーが発生しました: {e}")
+            self.scheduler.observe_failure()
+        finally:
+            interval = self.scheduler.next_interval()
+            self.jr_west_monitor_task.change_interval(seconds=interval)
+            logger.debug(f"次のJR西日本の遅延チェックは{interval:.0f}秒後です")
+
+    def build_transition_embed(self, line: dict, transitions: list[tuple[str, dict]]) -> discord.Embed:
+        """列車ごとの遅延の変化をまとめたEmbedを作成"""
+        worst = max((train["delay_minutes"] for kind, train in transitions if kind != RECOVERED), default=0)
+        embed = discord.Embed(
+            title=f"🚃 {line['name']}({line['range']})",
+            color=discord.Color.red() if worst else discord.Color.green(),
+            timestamp=datetime.now()
+        )
+        for kind in (DELAYED, WORSENED, RECOVERED):
+            lines = [format_delayed_train(train) for k, train in transitions if k == kind]
+            if not lines:
+                continue
+            value = "\n".join(lines)
+            if len(value) > 1024:
+                value = value[:1000].rsplit("\n", 1)[0] + "\n…"
+            embed.add_field(name=TRANSITION_LABELS[kind], value=value, inline=False)
+        return embed
+
+    @jr_west_monitor_task.before_loop
+    async def before_jr_west_monitor(self):
+        """ボットの準備ができるまで待機"""
+        await self.bot.wait_until_ready()
+
+    def find_line_key(self, line: str) -> str | None:
+        """路線キーまたは路線名から路線キーを探す"""
+        catalog = area_masters.catalog
+        if line in catalog.lines:
+            return line
+        for line_key, line_data in catalog.lines.items():
+            if line in (line_data["name"], f"{line_data['name']}({line_data['range']})"):
+                return line_key
+        return None
+
+    @commands.command(name="set_jr_west_monitor")
+    @commands.has_permissions(administrator=True)
+    async def set_jr_west_monitor(self, ctx, *, line: str):
+        """JR西日本の路線を遅延監視の対象に追加"""
+        await area_masters.ensure_loaded(self.session)
+        line_key = self.find_line_key(line)
+        if line_key is None:
+            await ctx.send(embed=discord.Embed(
+                title="❌ エラー",
+                description=f"`{line}`に該当する路線が見つかりませんでした",
+                color=discord.Color.red()
+            ))
+            return
+        try:
+            await self.bot.subscriptions.add_jr_west_line(ctx.guild.id, line_key)
+            line_data = area_masters.catalog.lines[line_key]
+            embed = discord.Embed(
+                title="✅ 設定完了",
+                description=f"{line_data['name']}({line_data['range']}) の遅延監視を開始しました",
+                color=discord.Color.green()
+            )
+            if self.bot.subscriptions.get_delay_channel_id(ctx.guild.id) is None:
+                embed.add_field(name="注意", value="`/set_delay_channel` で通知先のチャンネルを設定してください", inline=False)
+            await ctx.send(embed=embed)
+        except Exception as e:
+            logger.error(f"JR西日本の監視設定でエラーが発生しました: {e}")
+            await ctx.send(embed=discord.Embed(
+                title="❌ エラー",
+                description="設定の保存に失敗しました",
+                color=discord.Color.red()
+            ))
+
+    @commands.command(name="remove_jr_west_monitor")
+    @commands.has_permissions(administrator=True)
+    async def remove_jr_west_monitor(self, ctx, *, line: str):
+        """JR西日本の路線を遅延監視の対象から削除"""
+        await area_masters.ensure_loaded(self.session)
+        line_key = self.find_line_key(line) or line
+        if line_key not in self.bot.subscriptions.get_jr_west_lines(ctx.guild.id):
+            await ctx.send(embed=discord.Embed(
+                title="❌ エラー",
+                description=f"`{line}`は監視対象に含まれていません",
+                color=discord.Color.red()
+            ))
+            return
+        try:
+            await self.bot.subscriptions.remove_jr_west_line(ctx.guild.id, line_key)
+            await ctx.send(embed=discord.Embed(
+                title="✅ 設定完了",
+                description=f"`{line}`の遅延監視を終了しました",
+                color=discord.Color.green()
+            ))
+        except Exception as e:
+            logger.error(f"JR西日本の監視設定でエラーが発生しました: {e}")
+            await ctx.send(embed=discord.Embed(
+                title="❌ エラー",
+                description="設定の保存に失敗しました",
+                color=discord.Color.red()
+            ))
+
+async def setup(bot):
+    await bot.add_cog(JRWestMonitor(bot))
@@ -0,0 +1,138 @@
+import discord
+from discord.ext import commands, tasks
+from logging import getLogger
+import sys
+import os
+from datetime import datetime
+from typing import Optional
+
+# プロジェクトルートを sys.path に追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from API.TokyoMetro import format_railway_name, resolve_railway
+from API.train_tracker import TrainDelta, train_key
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 遅れているとみなす遅延（秒）
+DELAYED_SECONDS = 60
+
+# 1つのEmbedに表示する列車数の上限
+MAX_TRAINS_PER_EMBED = 20
+
+
+class TrainTracker(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.tracker = bot.train_tracker
+        self.delayed: dict[str, dict] = {}  # 遅れている列車（差分から更新）
+        self.session = None
+        self._unsubscribe = None
+
+    async def cog_load(self):
+        """Cogが読み込まれた際に列車位置の追跡を開始"""
+        self.session = await self.bot.shared_session.acquire()
+        self._unsubscribe = self.tracker.subscribe(self.on_delta)
+        logger.info("列車位置の追跡を開始します")
+        self.train_tracker_task.start()
+
+    async def cog_unload(self):
+        """Cogがアンロードされた際に列車位置の追跡を停止"""
+        logger.info("列車位置の追跡を停止します")
+        self.train_tracker_task.cancel()
+        if self._unsubscribe:
+            self._unsubscribe()
+        await self.bot.shared_session.release()
+
+    @tasks.loop(seconds=30)
+    async def train_tracker_task(self):
+        """列車位置を取得し、差分を購読者に配る"""
+        try:
+            delta = await self.tracker.poll(self.session)
+            if delta:
+                logger.debug(f"列車位置の差分: {delta!r}")
+        except Exception as e:
+            logger.error(f"列車位置の追跡でエラーが発生しました: {e}")
+
+    @train_tracker_task.before_loop
+    async def before_train_tracker(self):
+        """ボットの準備ができるまで待機"""
+        await self.bot.wait_until_ready()
+
+    def on_delta(self, delta: TrainDelta):
+        """差分から遅れている列車の一覧を更新（全列車を走査し直さない）"""
+        for train in delta.appeared:
+            self._update_delayed(train)
+        for train, _ in delta.moved:
+            self._update_delayed(train)
+        for train, _ in delta.delay_changed:
+            self._update_delayed(train)
+        for train in delta.disappeared:
+            self.delayed.pop(train_key(train), None)
+
+    def _update_delayed(self, train: dict):
+        key = train_key(train)
+        if train.get("delay", 0) >= DELAYED_SECONDS:
+            self.delayed[key] = train
+        else:
+            self.delayed.pop(key, None)
+
+    def station_name(self, station_id: Optional[str]) -> str:
+        """駅IDを駅名に変換（運賃Cogの駅索引があれば使う）"""
+        if not station_id:
+            return "?"
+        fare_info = self.bot.get_cog("FareInfo")
+        if fare_info is not None:
+            return fare_info.station_display_name(station_id)
+        return station_id.rsplit(".", 1)[-1]
+
+    def format_train(self, train: dict) -> str:
+        position = self.station_name(train.get("from_station"))
+        if train.get("to_station"):
+            position += f" → {self.station_name(train['to_station'])}"
+        return f"{train.get('train_number')} {train['delay'] // 60}分遅れ {position}"
+
+    @commands.command(name="train_delays")
+    async def train_delays(self, ctx, *, railway: str = None):
+        """遅れている列車を表示（路線名を指定するとその路線のみ）"""
+        target = resolve_railway(railway) if railway else None
+        if railway and (target is None or not target.startswith("odpt.Railway:")):
+            embed = discord.Embed(
+                title="❌ エラー",
+                description=f"`{railway}`に該当する路線が見つかりませんでした",
+                color=discord.Color.red()
+            )
+            await ctx.send(embed=embed)
+            return
+
+        trains = [
+            train for train in self.delayed.values()
+            if target is None or train.get("railway") == target
+        ]
+        if not trains:
+            embed = discord.Embed(
+                title="✅ 列車の遅れ",
+                description="現在、遅れている列車はありません",
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            await ctx.send(embed=embed)
+            return
+
+        trains.sort(key=lambda train: train["delay"], reverse=True)
+        by_railway: dict[str, list[str]] = {}
+        for train in trains[:MAX_TRAINS_PER_EMBED]:
+            by_railway.setdefault(train.get("railway") or "", []).append(self.format_train(train))
+        embed = discord.Embed(
+            title="🚨 遅れている列車",
+            description=f"{len(trains)}本",
+            color=discord.Color.red(),
+            timestamp=datetime.now()
+        )
+        for railway_id, lines in by_railway.items():
+            embed.add_field(name=format_railway_name(railway_id), value="\n".join(lines), inline=False)
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(TrainTracker(bot))
@@ -38,4 +38,23 @@ class Config:
                         channels[int(guild_id)] = int(channel_id)
                 except ValueError:
                     continue
-        return channels
\ No newline at end of file
+        return channels
+    
+    def get_jr_west_lines(self, guild_id: int) -> list[str]:
+        """指定されたサーバーが監視しているJR西日本の路線キーを取得"""
+        if "JR_WEST_MONITORING" in self.config and str(guild_id) in self.config["JR_WEST_MONITORING"]:
+            value = self.config["JR_WEST_MONITORING"][str(guild_id)]
+            return [line.strip() for line in value.split(",") if line.strip()]
+        return []
+    
+    def get_all_jr_west_lines(self) -> dict[int, list[str]]:
+        """すべてのサーバーのJR西日本監視路線を取得"""
+        lines = {}
+        if "JR_WEST_MONITORING" in self.config:
+            for guild_id in self.config["JR_WEST_MONITORING"]:
+                try:
+                    if not guild_id.startswith('#'):
+                        lines[int(guild_id)] = self.get_jr_west_lines(int(guild_id))
+                except ValueError:
+                    continue
+        return lines
@@ -2,11 +2,19 @@ import traceback
 import discord
 from discord.ext import commands
 from env.config import Config
+from API.session import SharedSession
+from API.train_tracker import TrainTracker
+from utils.notifier import NotificationDispatcher
+from utils.subscriptions import SubscriptionStore
+from utils.history import DelayHistoryStore
 
 INITIAL_EXTENSIONS = [
 "cogs.fare_info",
 "cogs.JR_West",
 "cogs.delay_monitor",
+"cogs.jr_west_monitor",
+"cogs.train_tracker",
+"cogs.delay_stats",
 ]
 
 config = Config()
@@ -16,6 +24,16 @@ intents = discord.Intents.all()
 activity = discord.Activity(name="起動中", type=discord.ActivityType.playing)
 
 bot = commands.Bot(command_prefix="/", intents=intents, activity=activity)
+# 全Cogで共有するHTTPセッション
+bot.shared_session = SharedSession()
+# 全Cogで共有する通知の配信
+bot.notifier = NotificationDispatcher(bot)
+# 全Cogで共有する通知設定
+bot.subscriptions = SubscriptionStore()
+# 全Cogで共有する列車位置の追跡（差分を購読して使う）
+bot.train_tracker = TrainTracker()
+# 全Cogで共有する遅延履歴
+bot.history = DelayHistoryStore()
 
 
 @bot.event
@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+
+from utils.delay_stats import DelayStats, jr_west_delay, metro_disruption
+from utils.history import RESOLVED, STATUS_CHANGED, TOKYO_METRO, DelayHistoryStore
+
+
+def test_metro_disruption_without_resolution_stays_open_until_end():
+    events = {"ts": [0, 3600], "line": ["A", "A"], "kind": ["status", "status"]}
+    result = metro_disruption(events, 0, 7200)
+    assert result["lines"] == ["A"]
+    assert result["incidents"].tolist() == [1]
+    assert np.isclose(result["totals"][0], 120)
+
+
+def test_metro_disruption_with_resolution():
+    events = {
+        "ts": [0, 1800, 600],
+        "line": ["A", "A", "B"],
+        "kind": ["status", "resolved", "status"],
+    }
+    result = metro_disruption(events, 0, 3600)
+    assert result["lines"] == ["A", "B"]
+    assert result["incidents"].tolist() == [1, 1]
+    assert np.allclose(result["totals"], [30, 50])
+
+
+def test_jr_west_delay_counts_each_train_once():
+    # 列車1は 5 -> 10 -> 15 分と段階を上げ、最後に回復。列車2は 30 分
+    events = {
+        "ts": [0, 60, 120, 180, 0],
+        "line": ["kinki:a"] * 5,
+        "train": ["1", "1", "1", "1", "2"],
+        "kind": ["delayed", "worsened", "worsened", "recovered", "delayed"],
+        "delay_minutes": [5, 10, 15, 0, 30],
+        "station": ["大阪", "新大阪", "京都", None, "大阪"],
+    }
+    result = jr_west_delay(events, "line")
+    assert result["keys"] == ["kinki:a"]
+    assert result["count"].tolist() == [2]
+    assert result["mean"].tolist() == [22.5]
+    assert result["max"].tolist() == [30]
+
+    # 駅ごとの集計は最大の遅延を記録した駅に数える
+    result = jr_west_delay(events, "station", "kinki:a")
+    assert result["keys"] == ["大阪", "京都"]
+    assert result["count"].tolist() == [1, 1]
+    assert result["mean"].tolist() == [30, 15]
+
+
+def test_jr_west_delay_separates_service_days():
+    day = 24 * 60 * 60
+    events = {
+        "ts": [0, day],
+        "line": ["kinki:a", "kinki:a"],
+        "train": ["1", "1"],
+        "kind": ["delayed", "delayed"],
+        "delay_minutes": [10, 20],
+        "station": ["大阪", "大阪"],
+    }
+    result = jr_west_delay(events, "line")
+    assert result["count"].tolist() == [2]
+    assert result["mean"].tolist() == [15]
+
+
+def test_metro_disruption_started_long_before_window(tmp_path, monkeypatch):
+    day = 24 * 60 * 60
+    now = 100 * day
+    monkeypatch.setattr("utils.delay_stats.time.time", lambda: now)
+
+    async def collect():
+        history = DelayHistoryStore(str(tmp_path / "history.sqlite3"))
+        # A は期間の3日前から発生中、B は期間の前に正常化済み
+        history.record(TOKYO_METRO, "A", STATUS_CHANGED, ts=now - 4 * day)
+        history.record(TOKYO_METRO, "B", STATUS_CHANGED, ts=now - 4 * day)
+        history.record(TOKYO_METRO, "B", RESOLVED, ts=now - 3 * day)
+        await history.open()
+        try:
+            return await DelayStats(history).metro_disruption(1)
+        finally:
+            await history.close()
+
+    result = asyncio.run(collect())
+    totals = dict(zip(result["lines"], result["totals"]))
+    assert np.isclose(totals["A"], 24 * 60)
+    assert np.isclose(totals.get("B", 0), 0)
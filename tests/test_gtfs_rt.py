@@ -0,0 +1,89 @@
+import asyncio
+
+from google.transit import gtfs_realtime_pb2
+
+from API.gtfs_rt import DIFFERENTIAL, FULL_DATASET, GtfsRealtimeSource, write_feed_file
+
+
+def trip_update(entity_id: str, trip_id: str, vehicle_id: str, delay: int) -> gtfs_realtime_pb2.FeedEntity:
+    entity = gtfs_realtime_pb2.FeedEntity(id=entity_id)
+    entity.trip_update.trip.trip_id = trip_id
+    entity.trip_update.vehicle.id = vehicle_id
+    entity.trip_update.delay = delay
+    return entity
+
+
+def vehicle(entity_id: str, trip_id: str, vehicle_id: str) -> gtfs_realtime_pb2.FeedEntity:
+    entity = gtfs_realtime_pb2.FeedEntity(id=entity_id)
+    entity.vehicle.trip.trip_id = trip_id
+    entity.vehicle.vehicle.id = vehicle_id
+    entity.vehicle.position.latitude = 34.7
+    entity.vehicle.position.longitude = 135.5
+    return entity
+
+
+def deleted(entity_id: str) -> gtfs_realtime_pb2.FeedEntity:
+    return gtfs_realtime_pb2.FeedEntity(id=entity_id, is_deleted=True)
+
+
+def poll(source: GtfsRealtimeSource):
+    return asyncio.run(source.poll())
+
+
+def test_full_then_differential_feed(tmp_path):
+    full_path = tmp_path / "full.pb"
+    diff_path = tmp_path / "diff.pb"
+    write_feed_file(
+        str(full_path),
+        [trip_update("1", "T1", "V1", 120), vehicle("2", "T2", "V2"), trip_update("3", "T3", "V3", 30)],
+        FULL_DATASET,
+        timestamp=1000,
+    )
+    write_feed_file(
+        str(diff_path),
+        [trip_update("1", "T1", "V1", 300), deleted("2"), vehicle("4", "T4", "V4")],
+        DIFFERENTIAL,
+        timestamp=1060,
+    )
+
+    source = GtfsRealtimeSource(str(full_path))
+    assert source.is_file
+    updated, removed = poll(source)
+    state = source.state
+    assert updated == {"1", "2", "3"}
+    assert removed == set()
+    assert {record.trip_id for record in state.trip_updates.values()} == {"T1", "T3"}
+    assert {record.vehicle_id for record in state.vehicles.values()} == {"V2"}
+    assert [trip.trip_id for trip in state.delayed_trips()] == ["T1"]
+
+    source.location = f"file://{diff_path}"
+    updated, removed = poll(source)
+    assert updated == {"1", "4"}
+    assert removed == {"2"}
+    # 差分に含まれない T3 は残り、T1 は更新され、V2 は削除される
+    assert {record.trip_id for record in state.trip_updates.values()} == {"T1", "T3"}
+    assert state.trip_updates["1"].delay == 300
+    assert {record.vehicle_id for record in state.vehicles.values()} == {"V4"}
+    assert state.timestamp == 1060
+
+
+def test_full_dataset_drops_missing_entities(tmp_path):
+    path = tmp_path / "feed.pb"
+    source = GtfsRealtimeSource(str(path))
+    write_feed_file(str(path), [trip_update("1", "T1", "V1", 0), vehicle("2", "T2", "V2")], timestamp=1000)
+    poll(source)
+    write_feed_file(str(path), [vehicle("2", "T2", "V2")], FULL_DATASET, timestamp=1060)
+    updated, removed = poll(source)
+    assert updated == {"2"}
+    assert removed == {"1"}
+    assert source.state.trip_updates == {}
+
+
+def test_older_feed_is_ignored(tmp_path):
+    path = tmp_path / "feed.pb"
+    source = GtfsRealtimeSource(str(path))
+    write_feed_file(str(path), [vehicle("1", "T1", "V1")], timestamp=1060)
+    poll(source)
+    write_feed_file(str(path), [deleted("1")], DIFFERENTIAL, timestamp=1000)
+    assert poll(source) == (set(), set())
+    assert set(source.state.vehicles) == {"1"}
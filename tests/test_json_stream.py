@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+from API.json_stream import JSONArrayParser, iter_json_array
+
+CASES = [
+    b"[1,2.5]",
+    b"[-12.5e+3, 0.25 , 100]",
+    b'[{"a": [1, 2]}, "x,y]", true, null, false]',
+    b'[1.5, {"\xe9\x81\x85\xe5\xbb\xb6": 3}, 2E-2]',
+]
+
+
+def feed_in_chunks(data: bytes, size: int) -> list:
+    parser = JSONArrayParser()
+    items = []
+    for start in range(0, len(data), size):
+        items.extend(parser.feed(data[start:start + size]))
+    items.extend(parser.feed(b"", final=True))
+    assert parser.finished
+    return items
+
+
+@pytest.mark.parametrize("data", CASES)
+def test_small_chunks_match_json_loads(data):
+    expected = json.loads(data)
+    for size in range(1, len(data) + 1):
+        assert feed_in_chunks(data, size) == expected
+
+
+def test_truncated_number_is_not_emitted():
+    parser = JSONArrayParser()
+    assert list(parser.feed(b"[1,2.")) == [1]
+    assert list(parser.feed(b"5]")) == [2.5]
+    assert parser.finished
+
+
+def test_iter_json_array_one_byte_at_a_time():
+    async def chunks():
+        for byte in b"[1,2.5]":
+            yield bytes([byte])
+
+    async def collect():
+        return [item async for item in iter_json_array(chunks())]
+
+    assert asyncio.run(collect()) == [1, 2.5]
+
+
+def test_unterminated_array_raises():
+    async def chunks():
+        yield b"[1,2"
+
+    async def collect():
+        return [item async for item in iter_json_array(chunks())]
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect())
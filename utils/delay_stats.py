@@ -0,0 +1,183 @@
+import asyncio
+import time
+from typing import Optional
+
+import numpy as np
+
+from API.cache import LRUCache
+from utils.history import END_KINDS, JR_WEST, TOKYO_METRO, DelayHistoryStore
+
+# 日本時間のUNIX時間からのずれ（秒）
+JST_OFFSET = 9 * 60 * 60
+# 1970-01-01 は木曜日（月曜日を0とした曜日に合わせる）
+EPOCH_WEEKDAY = 3
+WEEKDAYS = "月火水木金土日"
+HOURS_PER_WEEK = 7 * 24
+
+# 集計結果を使い回す時間の区切り（秒）。同じ区切り内の同じ問い合わせはキャッシュから返す
+CACHE_BUCKET = 5 * 60
+
+# 運行日の区切り（日本時間の4時。深夜の列車は前日の運行日に含める）
+SERVICE_DAY_START = 4 * 60 * 60
+
+
+def format_slot(slot: int) -> str:
+    """曜日×時台の番号を "月曜 8時台" の形にする"""
+    return f"{WEEKDAYS[slot // 24]}曜 {slot % 24}時台"
+
+
+def disruption_intervals(
+    ts: np.ndarray, line_codes: np.ndarray, active: np.ndarray, since: float, until: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """路線ごとの運行情報の発生・正常化の履歴から、(路線, 開始, 終了) の配列を作る"""
+    order = np.lexsort((ts, line_codes))
+    ts = ts[order]
+    lines = line_codes[order]
+    active = active[order]
+
+    same_line = np.r_[False, lines[1:] == lines[:-1]]
+    previous_active = np.r_[False, active[:-1]] & same_line
+    start_index = np.flatnonzero(active & ~previous_active)
+    end_index = np.flatnonzero(~active & previous_active)
+
+    # 開始ごとに、それより後で最初の正常化を探す（同じ路線でなければ発生中のまま）
+    if len(end_index) == 0:
+        # 正常化が1件もなければ、すべて期間の終わりまで発生中とする
+        has_end = np.zeros(len(start_index), dtype=bool)
+        matched = np.zeros(len(start_index), dtype=np.int64)
+    else:
+        position = np.searchsorted(end_index, start_index)
+        has_end = position < len(end_index)
+        matched = end_index[np.minimum(position, len(end_index) - 1)]
+        has_end &= lines[matched] == lines[start_index]
+
+    starts = np.maximum(ts[start_index], since)
+    ends = np.where(has_end, ts[matched], until)
+    ends = np.minimum(ends, until)
+    valid = ends > starts
+    return lines[start_index][valid], starts[valid], ends[valid]
+
+
+def minutes_by_slot(
+    lines: np.ndarray, starts: np.ndarray, ends: np.ndarray, line_count: int
+) -> np.ndarray:
+    """区間を1時間ごとに分割し、路線×(曜日×時台) の分数の表を作る"""
+    table = np.zeros((line_count, HOURS_PER_WEEK))
+    if len(starts) == 0:
+        return table
+    local_starts = starts + JST_OFFSET
+    local_ends = ends + JST_OFFSET
+    first_hour = np.floor(local_starts / 3600).astype(np.int64)
+    last_hour = np.floor((local_ends - 1e-6) / 3600).astype(np.int64)
+    counts = last_hour - first_hour + 1
+
+    # 区間ごとの時間数だけ展開する
+    interval = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    hours = first_hour[interval] + (np.arange(len(interval)) - offsets)
+    overlap = (
+        np.minimum(local_ends[interval], (hours + 1) * 3600)
+        - np.maximum(local_starts[interval], hours * 3600)
+    )
+    weekday = (hours // 24 + EPOCH_WEEKDAY) % 7
+    slot = weekday * 24 + hours % 24
+    np.add.at(table, (lines[interval], slot), overlap / 60)
+    return table
+
+
+def metro_disruption(events: dict[str, list], since: float, until: float) -> dict:
+    """東京メトロの路線ごとの運行情報の発生時間（分）を曜日×時台で集計"""
+    line_names, line_codes = np.unique(np.array(events["line"], dtype=object), return_inverse=True)
+    ts = np.asarray(events["ts"], dtype=np.float64)
+    active = ~np.isin(np.array(events["kind"], dtype=object), END_KINDS)
+    lines, starts, ends = disruption_intervals(ts, line_codes, active, since, until)
+    table = minutes_by_slot(lines, starts, ends, len(line_names))
+    return {
+        "lines": [str(name) for name in line_names],
+        "table": table,
+        "totals": table.sum(axis=1),
+        "incidents": np.bincount(lines, minlength=len(line_names)),
+    }
+
+
+def jr_west_delay(events: dict[str, list], group_by: str, line: Optional[str] = None) -> dict:
+    """JR西日本の列車の遅延（分）を group_by（"station" または "line"）ごとに平均
+
+    履歴は段階をまたいだときの記録のため、先に列車（路線・列車番号・運行日）ごとに
+    最大の遅延の1件にまとめてから集計する。駅はその最大の遅延を記録した駅とする。
+    """
+    kinds = np.array(events["kind"], dtype=object)
+    mask = ~np.isin(kinds, END_KINDS)
+    if line is not None:
+        mask &= np.array(events["line"], dtype=object) == line
+    if not mask.any():
+        return {"keys": [], "mean": np.zeros(0), "max": np.zeros(0), "count": np.zeros(0, dtype=np.int64)}
+
+    delays = np.array([value or 0 for value in events["delay_minutes"]], dtype=np.float64)[mask]
+    keys = np.array([value or "不明" for value in events[group_by]], dtype=object)[mask]
+    lines = np.array(events["line"], dtype=object)[mask]
+    trains = np.array([value or "" for value in events["train"]], dtype=object)[mask]
+    _, line_codes = np.unique(lines, return_inverse=True)
+    _, train_codes = np.unique(trains, return_inverse=True)
+    days = np.floor(
+        (np.asarray(events["ts"], dtype=np.float64)[mask] + JST_OFFSET - SERVICE_DAY_START) / 86400
+    ).astype(np.int64)
+    _, trips = np.unique(np.stack([line_codes, train_codes, days], axis=1), axis=0, return_inverse=True)
+    trips = trips.ravel()
+
+    # 列車ごとに遅延が最大の記録を1件選ぶ（列車 -> 遅延 の順に並べて各列車の最後）
+    order = np.lexsort((delays, trips))
+    last = np.r_[trips[order][1:] != trips[order][:-1], True]
+    representative = order[last]
+    delays = delays[representative]
+    keys = keys[representative]
+
+    names, codes = np.unique(keys, return_inverse=True)
+    count = np.bincount(codes, minlength=len(names))
+    total = np.bincount(codes, weights=delays, minlength=len(names))
+    maximum = np.zeros(len(names))
+    np.maximum.at(maximum, codes, delays)
+    order = np.argsort(-total / count, kind="stable")
+    return {
+        "keys": [str(names[i]) for i in order],
+        "mean": (total / count)[order],
+        "max": maximum[order],
+        "count": count[order],
+    }
+
+
+class DelayStats:
+    """遅延履歴の集計（同じ問い合わせは CACHE_BUCKET ごとにキャッシュ）"""
+
+    def __init__(self, history: DelayHistoryStore, cache_size: int = 64):
+        self.history = history
+        self._cache = LRUCache(cache_size)
+
+    def _window(self, days: int) -> tuple[int, float, float]:
+        bucket = int(time.time() // CACHE_BUCKET)
+        until = float(bucket * CACHE_BUCKET)
+        return bucket, until - days * 24 * 60 * 60, until
+
+    async def metro_disruption(self, days: int) -> dict:
+        bucket, since, until = self._window(days)
+        key = ("metro_disruption", days, bucket)
+        result = self._cache.get(key)
+        if result is None:
+            # 期間の開始時点で発生中だった運行情報を拾うため、開始前の路線ごとの最新の履歴を先頭に加える
+            before = await self.history.load_latest_before(TOKYO_METRO, since)
+            events = await self.history.load_events(TOKYO_METRO, since, until)
+            events = {column: before[column] + values for column, values in events.items()}
+            result = await asyncio.to_thread(metro_disruption, events, since, until)
+            self._cache.put(key, result)
+        return result
+
+    async def jr_west_delay(self, days: int, line: Optional[str] = None) -> dict:
+        bucket, since, until = self._window(days)
+        key = ("jr_west_delay", days, line, bucket)
+        result = self._cache.get(key)
+        if result is None:
+            events = await self.history.load_events(JR_WEST, since, until)
+            group_by = "station" if line else "line"
+            result = await asyncio.to_thread(jr_west_delay, events, group_by, line)
+            self._cache.put(key, result)
+        return result
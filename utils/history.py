@@ -0,0 +1,219 @@
+import asyncio
+import os
+import sqlite3
+import time
+from logging import getLogger
+from typing import Optional
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 遅延履歴の保存先（プロジェクトルート/data/history.sqlite3）
+DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "history.sqlite3")
+)
+
+# 取得元
+TOKYO_METRO = "tokyo_metro"
+JR_WEST = "jr_west"
+
+# 状態の変化の種類（JR西日本は API.JRWest の DELAYED / WORSENED / RECOVERED / GONE を使う）
+STATUS_CHANGED = "status"  # 東京メトロの運行情報の発生・変更
+RESOLVED = "resolved"  # 東京メトロの運行情報の正常化
+# 遅延が終わったことを表す種類
+END_KINDS = ("resolved", "recovered", "gone")
+
+# まとめて書き込む間隔（秒）と件数
+FLUSH_INTERVAL = 5
+FLUSH_SIZE = 500
+
+# 再起動時に引き継ぐ状態の古さの上限（秒）
+RESUME_MAX_AGE = 6 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS delay_events (
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    line TEXT NOT NULL,
+    train TEXT,
+    kind TEXT NOT NULL,
+    status TEXT,
+    delay_minutes INTEGER,
+    station TEXT,
+    time_of_origin TEXT,
+    operator TEXT
+);
+CREATE INDEX IF NOT EXISTS delay_events_source_ts ON delay_events (source, ts);
+"""
+
+COLUMNS = (
+    "ts", "source", "line", "train", "kind", "status", "delay_minutes", "station", "time_of_origin", "operator"
+)
+
+
+class DelayHistoryStore:
+    """運行状況の変化を追記していく履歴（SQLite WAL）
+
+    record() はメモリ上のバッファに追加するだけで、書き込みはバックグラウンドで
+    FLUSH_INTERVAL 秒ごと（または FLUSH_SIZE 件たまったとき）にまとめて
+    イベントループの外で行う。行の更新・削除は行わない。
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._buffer: list[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def open(self):
+        """データベースを開いて書き込みタスクを開始（2回目以降は何もしない）"""
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        # 運営会社の列が無い古い履歴には列を追加する
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(delay_events)")}
+        if "operator" not in columns:
+            conn.execute("ALTER TABLE delay_events ADD COLUMN operator TEXT")
+        return conn
+
+    async def close(self):
+        """残っている履歴を書き込んでから閉じる"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+    def record(
+        self,
+        source: str,
+        line: str,
+        kind: str,
+        *,
+        train: Optional[str] = None,
+        status: Optional[str] = None,
+        delay_minutes: Optional[int] = None,
+        station: Optional[str] = None,
+        time_of_origin: Optional[str] = None,
+        operator: Optional[str] = None,
+        ts: Optional[float] = None,
+    ):
+        """状態の変化を1件追加（書き込みはまとめて行う）"""
+        self._buffer.append((
+            ts if ts is not None else time.time(),
+            source, line, train, kind, status, delay_minutes, station, time_of_origin, operator,
+        ))
+        if len(self._buffer) >= FLUSH_SIZE:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"遅延履歴の書き込みでエラーが発生しました: {e}")
+
+    async def flush(self):
+        """バッファの履歴をまとめて書き込む"""
+        if not self._buffer:
+            return
+        async with self._lock:
+            if self._conn is None:
+                return
+            rows, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._insert, rows)
+            except sqlite3.Error:
+                # 書き込めなかった分は次回に回す
+                self._buffer[:0] = rows
+                raise
+        logger.debug(f"遅延履歴を{len(rows)}件書き込みました")
+
+    def _insert(self, rows: list[tuple]):
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO delay_events ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+
+    async def load_active(self, source: str, max_age: float = RESUME_MAX_AGE) -> list[dict]:
+        """路線・列車ごとの最新の履歴のうち、遅延が続いているものを返す（再起動時の復元用）"""
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            return await asyncio.to_thread(self._select_active, source, time.time() - max_age)
+
+    async def load_latest_before(self, source: str, before: float) -> dict[str, list]:
+        """路線・列車ごとに before より前の最新の履歴を列ごとのリストで返す（期間の開始時点の状態用）"""
+        await self.flush()
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            return await asyncio.to_thread(self._select_latest_before, source, before)
+
+    def _select_latest_before(self, source: str, before: float) -> dict[str, list]:
+        cursor = self._conn.execute(
+            f"""
+            SELECT {', '.join(COLUMNS)} FROM delay_events
+            WHERE rowid IN (
+                SELECT MAX(rowid) FROM delay_events
+                WHERE source = ? AND ts < ?
+                GROUP BY line, train
+            )
+            ORDER BY ts
+            """,
+            (source, before),
+        )
+        rows = cursor.fetchall()
+        return {column: [row[i] for row in rows] for i, column in enumerate(COLUMNS)}
+
+    def _select_active(self, source: str, since: float) -> list[dict]:
+        cursor = self._conn.execute(
+            f"""
+            SELECT {', '.join(COLUMNS)} FROM delay_events
+            WHERE rowid IN (
+                SELECT MAX(rowid) FROM delay_events
+                WHERE source = ? AND ts >= ?
+                GROUP BY line, train
+            )
+            """,
+            (source, since),
+        )
+        rows = [dict(zip(COLUMNS, row)) for row in cursor]
+        return [row for row in rows if row["kind"] not in END_KINDS]
+
+    async def load_events(self, source: str, since: float, until: Optional[float] = None) -> dict[str, list]:
+        """期間内の履歴を列ごとのリストで返す（集計用。未書き込みの分も先に書き込む）"""
+        await self.flush()
+        async with self._lock:
+            if self._conn is None:
+                self._conn = await asyncio.to_thread(self._connect)
+            return await asyncio.to_thread(self._select_columns, source, since, until or time.time())
+
+    def _select_columns(self, source: str, since: float, until: float) -> dict[str, list]:
+        cursor = self._conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM delay_events "
+            "WHERE source = ? AND ts >= ? AND ts < ? ORDER BY ts",
+            (source, since, until),
+        )
+        rows = cursor.fetchall()
+        return {column: [row[i] for row in rows] for i, column in enumerate(COLUMNS)}
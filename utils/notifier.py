@@ -0,0 +1,142 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Iterable, Optional
+
+import discord
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 1メッセージに載せられるEmbedの上限（Discordの制限）
+MAX_EMBEDS_PER_MESSAGE = 10
+# 1メッセージのEmbedの合計文字数の上限（Discordの制限）
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# 全体のレート制限（Discordは50リクエスト/秒。他の処理のために余裕を残す）
+GLOBAL_RATE = 40
+GLOBAL_PER = 1.0
+
+# 同時に送信中にするチャンネル数の上限
+MAX_CONCURRENT_CHANNELS = 25
+
+
+def pack_embeds(embeds: Iterable[discord.Embed]) -> list[list[discord.Embed]]:
+    """Embedを1メッセージあたりの件数・文字数の上限に収まるようにまとめる"""
+    messages: list[list[discord.Embed]] = []
+    current: list[discord.Embed] = []
+    chars = 0
+    for embed in embeds:
+        size = len(embed)
+        if current and (
+            len(current) >= MAX_EMBEDS_PER_MESSAGE or chars + size > MAX_EMBED_CHARS_PER_MESSAGE
+        ):
+            messages.append(current)
+            current = []
+            chars = 0
+        current.append(embed)
+        chars += size
+    if current:
+        messages.append(current)
+    return messages
+
+
+class RateLimiter:
+    """一定時間あたりの実行回数を制限するトークンバケット"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.rate, self._tokens + (now - self._updated) * self.rate / self.per
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+
+class DeliveryReport:
+    """1回の配信の結果"""
+
+    __slots__ = ("channels", "messages", "failed", "first_latency", "last_latency")
+
+    def __init__(self):
+        self.channels = 0
+        self.messages = 0
+        self.failed: list[int] = []
+        self.first_latency: Optional[float] = None  # 最初のチャンネルに届くまでの秒数
+        self.last_latency: Optional[float] = None  # 最後のチャンネルに届くまでの秒数
+
+    def record(self, latency: float):
+        self.channels += 1
+        if self.first_latency is None or latency < self.first_latency:
+            self.first_latency = latency
+        if self.last_latency is None or latency > self.last_latency:
+            self.last_latency = latency
+
+
+class NotificationDispatcher:
+    """複数チャンネルへの通知をまとめて同時に送信する
+
+    同じチャンネルへのメッセージは順番に、異なるチャンネルへは並行して送る。
+    チャンネルごとのレート制限（429）は discord.py が待機・再送するため、
+    ここでは全体の送信数だけを制限する。
+    """
+
+    def __init__(
+        self,
+        bot: discord.Client,
+        rate: int = GLOBAL_RATE,
+        per: float = GLOBAL_PER,
+        max_concurrent_channels: int = MAX_CONCURRENT_CHANNELS,
+    ):
+        self.bot = bot
+        self._limiter = RateLimiter(rate, per)
+        self._semaphore = asyncio.Semaphore(max_concurrent_channels)
+
+    async def dispatch(self, deliveries: dict[int, list[discord.Embed]]) -> DeliveryReport:
+        """{チャンネルID: [Embed, ...]} を送信し、配信結果を返す"""
+        report = DeliveryReport()
+        started = time.monotonic()
+
+        async def deliver(channel_id: int, embeds: list[discord.Embed]):
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                logger.warning(f"チャンネルが見つかりません: {channel_id}")
+                report.failed.append(channel_id)
+                return
+            async with self._semaphore:
+                # 1つのチャンネルの失敗で他のチャンネルへの配信を止めない
+                try:
+                    for message in pack_embeds(embeds):
+                        await self._limiter.acquire()
+                        await channel.send(embeds=message)
+                        report.messages += 1
+                except Exception as e:
+                    logger.error(f"チャンネル {channel_id} への送信でエラーが発生しました: {e}")
+                    report.failed.append(channel_id)
+                    return
+            report.record(time.monotonic() - started)
+
+        await asyncio.gather(
+            *(deliver(channel_id, embeds) for channel_id, embeds in deliveries.items() if embeds)
+        )
+        if report.channels:
+            logger.info(
+                f"通知を配信しました: {report.channels}チャンネル / {report.messages}メッセージ"
+                f"（最初 {report.first_latency:.2f}秒・最後 {report.last_latency:.2f}秒）"
+                f" 失敗: {len(report.failed)}"
+            )
+        elif report.failed:
+            logger.warning(f"通知の配信に失敗しました: {len(report.failed)}チャンネル")
+        return report
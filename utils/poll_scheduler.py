@@ -0,0 +1,108 @@
+import random
+from datetime import datetime
+from logging import getLogger
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+JST = ZoneInfo("Asia/Tokyo")
+
+# 運休時間帯（終電後〜始発前）の開始・終了時刻（時）
+NIGHT_START_HOUR = 1
+NIGHT_END_HOUR = 5
+
+# dct:valid の直後に取りに行くための余裕（秒）
+VALID_MARGIN = 5
+
+
+def parse_valid(values: Iterable[Optional[str]], now: Optional[datetime] = None) -> Optional[datetime]:
+    """dct:valid のうち、現在より後で最も早い時刻を返す"""
+    now = now or datetime.now(JST)
+    earliest = None
+    for value in values:
+        if not value:
+            continue
+        try:
+            valid = datetime.fromisoformat(value)
+        except ValueError:
+            continue
+        if valid.tzinfo is None:
+            valid = valid.replace(tzinfo=JST)
+        if valid > now and (earliest is None or valid < earliest):
+            earliest = valid
+    return earliest
+
+
+class AdaptivePollScheduler:
+    """直近の取得結果から次の取得までの間隔（秒）を決める
+
+    - 遅延が発生中・状況が変化した直後は min_interval で取得する
+    - 平常時は変化がない回数に応じて base_interval から max_interval まで延ばす
+    - 提供元が dct:valid で有効期限を示している場合は期限切れの直後に取得する
+    - 取得に失敗している間は遅延中でも連続失敗回数に応じて max_interval まで延ばす
+    - 深夜の運休時間帯は night_interval まで延ばす
+    - 複数の取得元が同時に動かないよう、間隔に ±jitter の揺らぎを加える
+    """
+
+    def __init__(
+        self,
+        base_interval: float = 60,
+        min_interval: float = 20,
+        max_interval: float = 300,
+        night_interval: float = 600,
+        backoff: float = 1.5,
+        jitter: float = 0.1,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.night_interval = night_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self._quiet_polls = 0
+        self._failures = 0
+        self._disrupted = False
+        self._valid_until: Optional[datetime] = None
+
+    def observe(self, changed: bool, disrupted: bool, valid_until: Optional[datetime] = None):
+        """取得結果を記録する"""
+        self._disrupted = disrupted
+        self._failures = 0
+        self._quiet_polls = 0 if changed or disrupted else self._quiet_polls + 1
+        self._valid_until = valid_until
+
+    def observe_failure(self):
+        """取得に失敗した場合は連続失敗回数に応じて間隔を延ばして再試行する"""
+        self._failures += 1
+        self._quiet_polls = 0
+        self._valid_until = None
+
+    def next_interval(self, now: Optional[datetime] = None) -> float:
+        now = now or datetime.now(JST)
+        if self._failures:
+            interval = min(self.base_interval * self.backoff ** self._failures, self.max_interval)
+        elif self._disrupted or self._quiet_polls == 0:
+            interval = self.min_interval if self._disrupted else self.base_interval
+        else:
+            interval = min(
+                self.base_interval * self.backoff ** (self._quiet_polls - 1), self.max_interval
+            )
+
+        if self._valid_until is not None and not self._disrupted:
+            until_valid = (self._valid_until - now).total_seconds() + VALID_MARGIN
+            # 有効期限までは更新されないため、期限切れの直後に取りに行く
+            interval = min(max(until_valid, self.min_interval), self.max_interval)
+
+        if NIGHT_START_HOUR <= now.astimezone(JST).hour < NIGHT_END_HOUR:
+            interval = max(interval, self.night_interval)
+            # 始発前には通常の間隔に戻す
+            morning = now.astimezone(JST).replace(
+                hour=NIGHT_END_HOUR, minute=0, second=0, microsecond=0
+            )
+            interval = min(interval, max((morning - now).total_seconds(), self.min_interval))
+
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(interval, self.min_interval)
+
@@ -0,0 +1,247 @@
+import asyncio
+import os
+import sqlite3
+from logging import getLogger
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from env.config import Config
+
+# ロガーの設定
+logger = getLogger(__name__)
+
+# 購読設定の保存先（プロジェクトルート/data/subscriptions.sqlite3）
+DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "subscriptions.sqlite3")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS delay_channels (
+    guild_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS railway_subscriptions (
+    guild_id INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (guild_id, target)
+);
+CREATE TABLE IF NOT EXISTS jr_west_lines (
+    guild_id INTEGER NOT NULL,
+    line_key TEXT NOT NULL,
+    PRIMARY KEY (guild_id, line_key)
+);
+"""
+
+
+class SubscriptionStore:
+    """サーバーごとの通知設定（SQLite + メモリ上の写し）
+
+    起動時に全件をメモリに読み込み、通知時の参照はメモリだけで行う。
+    変更は1件ずつトランザクションで書き込み、成功したらメモリ側にも反映する。
+    初回起動時は config.ini の [MONITORING] / [JR_WEST_MONITORING] を取り込む。
+
+    通知先の絞り込みには 路線ID・事業者ID -> サーバー の転置索引を使う。
+    路線・事業者を1つも購読していないサーバーには全路線の情報を送る。
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self._channels: dict[int, int] = {}
+        self._jr_west_lines: dict[int, list[str]] = {}
+        # 転置索引（路線ID・事業者ID -> サーバー、JR西日本の路線キー -> サーバー）
+        self._guild_targets: dict[int, set[str]] = {}
+        self._target_guilds: dict[str, set[int]] = {}
+        self._line_guilds: dict[str, set[int]] = {}
+        # 絞り込みを設定していないサーバーのチャンネル（変更時に作り直す）
+        self._broadcast_channels: Optional[frozenset[int]] = None
+
+    # --- 読み込み ---
+
+    async def load(self):
+        """データベースを開いてメモリに読み込む（2回目以降は何もしない）"""
+        async with self._lock:
+            if self._conn is None:
+                await asyncio.to_thread(self._open)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        with conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'config_imported'").fetchone() is None:
+                self._import_config(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('config_imported', '1')")
+
+        self._channels = dict(conn.execute("SELECT guild_id, channel_id FROM delay_channels"))
+        self._guild_targets = {}
+        self._target_guilds = {}
+        for guild_id, target in conn.execute("SELECT guild_id, target FROM railway_subscriptions"):
+            self._index_target(guild_id, target)
+        self._jr_west_lines = {}
+        self._line_guilds = {}
+        for guild_id, line_key in conn.execute(
+            "SELECT guild_id, line_key FROM jr_west_lines ORDER BY rowid"
+        ):
+            self._jr_west_lines.setdefault(guild_id, []).append(line_key)
+            self._line_guilds.setdefault(line_key, set()).add(guild_id)
+        self._broadcast_channels = None
+        self._conn = conn
+        logger.info(
+            f"購読設定を読み込みました: 通知チャンネル {len(self._channels)}件 / "
+            f"路線の絞り込み {len(self._guild_targets)}サーバー / JR西日本 {len(self._jr_west_lines)}サーバー"
+        )
+
+    @staticmethod
+    def _import_config(conn: sqlite3.Connection):
+        """config.ini の既存の設定を取り込む"""
+        config = Config()
+        channels = config.get_all_delay_channels()
+        conn.executemany(
+            "INSERT OR REPLACE INTO delay_channels (guild_id, channel_id) VALUES (?, ?)",
+            channels.items(),
+        )
+        lines = [
+            (guild_id, line_key)
+            for guild_id, line_keys in config.get_all_jr_west_lines().items()
+            for line_key in line_keys
+        ]
+        conn.executemany(
+            "INSERT OR IGNORE INTO jr_west_lines (guild_id, line_key) VALUES (?, ?)", lines
+        )
+        if channels or lines:
+            logger.info(f"config.ini から購読設定を取り込みました: {len(channels)}件 / {len(lines)}件")
+
+    async def close(self):
+        async with self._lock:
+            if self._conn is not None:
+                await asyncio.to_thread(self._conn.close)
+                self._conn = None
+
+    # --- 参照（メモリのみ） ---
+
+    def get_delay_channel_id(self, guild_id: int) -> Optional[int]:
+        """指定されたサーバーの遅延情報チャンネルIDを取得"""
+        return self._channels.get(guild_id)
+
+    def get_all_delay_channels(self) -> Mapping[int, int]:
+        """すべてのサーバーの遅延情報チャンネル設定を取得（読み取り専用）"""
+        return MappingProxyType(self._channels)
+
+    def get_railway_subscriptions(self, guild_id: int) -> set[str]:
+        """指定されたサーバーが購読している路線ID・事業者ID（空なら全路線）"""
+        return set(self._guild_targets.get(guild_id, ()))
+
+    def delay_channels_for(self, railway: Optional[str], operator: Optional[str] = None) -> set[int]:
+        """路線の運行情報を受け取るチャンネルIDを返す"""
+        guilds = set()
+        for target in (railway, operator):
+            if target:
+                guilds.update(self._target_guilds.get(target, ()))
+        channels = {self._channels[guild_id] for guild_id in guilds if guild_id in self._channels}
+        # 絞り込みを設定していないサーバーには全路線を送る
+        if self._broadcast_channels is None:
+            self._broadcast_channels = frozenset(
+                channel_id
+                for guild_id, channel_id in self._channels.items()
+                if guild_id not in self._guild_targets
+            )
+        channels.update(self._broadcast_channels)
+        return channels
+
+    def get_jr_west_lines(self, guild_id: int) -> list[str]:
+        """指定されたサーバーが監視しているJR西日本の路線キーを取得"""
+        return list(self._jr_west_lines.get(guild_id, ()))
+
+    def get_all_jr_west_lines(self) -> Mapping[int, list[str]]:
+        """すべてのサーバーのJR西日本監視路線を取得（読み取り専用）"""
+        return MappingProxyType(self._jr_west_lines)
+
+    def jr_west_line_guilds(self) -> Mapping[str, set[int]]:
+        """JR西日本の路線キーごとの監視サーバー（読み取り専用）"""
+        return MappingProxyType(self._line_guilds)
+
+    # --- 変更 ---
+
+    async def _write(self, sql: str, params: tuple):
+        async with self._lock:
+            if self._conn is None:
+                await asyncio.to_thread(self._open)
+            await asyncio.to_thread(self._execute, sql, params)
+
+    def _execute(self, sql: str, params: tuple):
+        with self._conn:
+            self._conn.execute(sql, params)
+
+    async def set_delay_channel(self, guild_id: int, channel_id: int):
+        await self._write(
+            "INSERT OR REPLACE INTO delay_channels (guild_id, channel_id) VALUES (?, ?)",
+            (guild_id, channel_id),
+        )
+        self._channels[guild_id] = channel_id
+        self._broadcast_channels = None
+
+    async def remove_delay_channel(self, guild_id: int):
+        await self._write("DELETE FROM delay_channels WHERE guild_id = ?", (guild_id,))
+        self._channels.pop(guild_id, None)
+        self._broadcast_channels = None
+
+    def _index_target(self, guild_id: int, target: str):
+        self._guild_targets.setdefault(guild_id, set()).add(target)
+        self._target_guilds.setdefault(target, set()).add(guild_id)
+        self._broadcast_channels = None
+
+    async def add_railway_subscription(self, guild_id: int, target: str):
+        """路線ID（odpt.Railway:...）または事業者ID（odpt.Operator:...）を購読"""
+        await self._write(
+            "INSERT OR IGNORE INTO railway_subscriptions (guild_id, target) VALUES (?, ?)",
+            (guild_id, target),
+        )
+        self._index_target(guild_id, target)
+
+    async def remove_railway_subscription(self, guild_id: int, target: str):
+        await self._write(
+            "DELETE FROM railway_subscriptions WHERE guild_id = ? AND target = ?",
+            (guild_id, target),
+        )
+        _discard(self._guild_targets, guild_id, target)
+        _discard(self._target_guilds, target, guild_id)
+        self._broadcast_channels = None
+
+    async def add_jr_west_line(self, guild_id: int, line_key: str):
+        await self._write(
+            "INSERT OR IGNORE INTO jr_west_lines (guild_id, line_key) VALUES (?, ?)",
+            (guild_id, line_key),
+        )
+        line_keys = self._jr_west_lines.setdefault(guild_id, [])
+        if line_key not in line_keys:
+            line_keys.append(line_key)
+        self._line_guilds.setdefault(line_key, set()).add(guild_id)
+
+    async def remove_jr_west_line(self, guild_id: int, line_key: str):
+        await self._write(
+            "DELETE FROM jr_west_lines WHERE guild_id = ? AND line_key = ?", (guild_id, line_key)
+        )
+        line_keys = self._jr_west_lines.get(guild_id)
+        if line_keys and line_key in line_keys:
+            line_keys.remove(line_key)
+            if not line_keys:
+                del self._jr_west_lines[guild_id]
+        _discard(self._line_guilds, line_key, guild_id)
+
+
+def _discard(index: dict, key, value):
+    """転置索引から1件削除し、空になったキーは取り除く"""
+    values = index.get(key)
+    if values is None:
+        return
+    values.discard(value)
+    if not values:
+        del index[key]